@@ -2,6 +2,7 @@ from .py.modelDualCLIP import PrepackModelDualCLIP
 from .py.modelSingleCLIP import PrepackModelSingleCLIP
 from .py.loras import PrepackLoras
 from .py.lorasmssd3 import PrepackLorasAndMSSD3
+from .py.loraSweep import PrepackLoraSweep
 from .py.ksampler import PrepackKsampler
 from .py.ksamplerAdvanced import PrepackKsamplerAdvanced
 from .py.setpipe import PrepackSetPipe
@@ -25,6 +26,7 @@ NODE_CLASS_MAPPINGS = {
     "PrepackModelSingleCLIP": PrepackModelSingleCLIP,
     "PrepackLoras": PrepackLoras,
     "PrepackLorasAndMSSD3": PrepackLorasAndMSSD3,
+    "PrepackLoraSweep": PrepackLoraSweep,
     "PrepackKsampler": PrepackKsampler,
     "PrepackKsamplerAdvanced": PrepackKsamplerAdvanced,
     "PrepackSetPipe": PrepackSetPipe,
@@ -46,6 +48,7 @@ NODE_DISPLAY_NAME_MAPPINGS = {
     "PrepackModelSingleCLIP": "💀Prepack Model SingleCLIP",
     "PrepackLoras": "💀Prepack Loras",
     "PrepackLorasAndMSSD3": "💀Prepack Loras and MSSD3",
+    "PrepackLoraSweep": "💀Prepack Lora Sweep",
     "PrepackKsampler": "💀Prepack Ksampler",
     "PrepackKsamplerAdvanced": "💀Prepack Ksampler Advanced",
     "PrepackSetPipe": "💀Prepack SetPipe",
@@ -0,0 +1,56 @@
+import os
+import sys
+import types
+import argparse
+import importlib
+
+"""Shared bootstrap for the Prepack benchmark scripts: import Prepack modules outside a running ComfyUI server."""
+
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Package name the py/ modules are imported under, so their relative imports resolve
+PACKAGE = "prepack_py"
+
+
+def parse_args(description, configure=None):
+    """Parse --comfyui (or COMFYUI_PATH) plus any script-specific options added by configure(parser)."""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--comfyui", default=os.environ.get("COMFYUI_PATH", ""),
+                        help="Path to a ComfyUI checkout (defaults to $COMFYUI_PATH).")
+    if configure is not None:
+        configure(parser)
+    args = parser.parse_args()
+    if args.comfyui:
+        sys.path.insert(0, os.path.abspath(args.comfyui))
+    return args
+
+
+def install_server_standin():
+    """Register a stand-in `server` module whose PromptServer.instance.routes collects the Prepack routes.
+
+    Prepack modules register aiohttp routes at import time on PromptServer.instance, which only exists
+    inside a running ComfyUI server. The stand-in exposes the collected routes as an aiohttp RouteTableDef.
+    """
+    from aiohttp import web
+
+    if "server" in sys.modules and hasattr(sys.modules["server"], "STANDIN"):
+        return sys.modules["server"].PromptServer.instance.routes
+
+    class PromptServer:
+        instance = types.SimpleNamespace(routes=web.RouteTableDef())
+
+    module = types.ModuleType("server")
+    module.PromptServer = PromptServer
+    module.STANDIN = True
+    sys.modules["server"] = module
+    return PromptServer.instance.routes
+
+
+def import_prepack(name):
+    """Import py/<name>.py as prepack_py.<name>."""
+    if PACKAGE not in sys.modules:
+        package = types.ModuleType(PACKAGE)
+        package.__path__ = [os.path.join(REPO_DIR, "py")]
+        sys.modules[PACKAGE] = package
+    return importlib.import_module(f"{PACKAGE}.{name}")
@@ -0,0 +1,125 @@
+import time
+from _prepack import parse_args, install_server_standin, import_prepack
+
+"""CPU benchmark: PrepackLoras runtime (forward-time low-rank) LoRA mode against the weight-merge path.
+
+Builds a small synthetic Linear/Conv2d model and a matching synthetic LoRA, then times a strength sweep
+through both paths: merge = add_patches + patch_model (deltas materialized into the weights), runtime =
+LowRankForward object patches. Run with a ComfyUI checkout on the path:
+
+    python benchmarks/lora_runtime_benchmark.py --comfyui /path/to/ComfyUI
+"""
+
+
+def configure(parser):
+    parser.add_argument("--dim", type=int, default=1024, help="Width of the Linear layers.")
+    parser.add_argument("--linears", type=int, default=16, help="Number of Linear layers.")
+    parser.add_argument("--channels", type=int, default=128, help="Channels of the Conv2d layers.")
+    parser.add_argument("--convs", type=int, default=4, help="Number of 3x3 Conv2d layers.")
+    parser.add_argument("--rank", type=int, default=16, help="LoRA rank.")
+    parser.add_argument("--strengths", type=int, default=8, help="Number of strength changes in the sweep.")
+    parser.add_argument("--steps", type=int, default=20, help="Forward passes per strength (sampling steps).")
+
+
+def build_model(torch, args):
+    class SyntheticModel(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.linears = torch.nn.ModuleList(torch.nn.Linear(args.dim, args.dim) for _ in range(args.linears))
+            self.convs = torch.nn.ModuleList(torch.nn.Conv2d(args.channels, args.channels, 3, padding=1) for _ in range(args.convs))
+
+        def forward(self, x, y):
+            for linear in self.linears:
+                x = torch.tanh(linear(x))
+            for conv in self.convs:
+                y = torch.tanh(conv(y))
+            return x, y
+
+    return SyntheticModel().eval()
+
+
+def build_lora(torch, model, rank):
+    """Return (kohya-style LoRA state dict, key_map) covering every layer of the synthetic model."""
+    lora = {}
+    key_map = {}
+    for index, linear in enumerate(model.linears):
+        prefix = f"lora_unet_linears_{index}"
+        lora[f"{prefix}.lora_down.weight"] = torch.randn(rank, linear.in_features) * 0.01
+        lora[f"{prefix}.lora_up.weight"] = torch.randn(linear.out_features, rank) * 0.01
+        lora[f"{prefix}.alpha"] = torch.tensor(float(rank))
+        key_map[prefix] = f"linears.{index}.weight"
+    for index, conv in enumerate(model.convs):
+        prefix = f"lora_unet_convs_{index}"
+        lora[f"{prefix}.lora_down.weight"] = torch.randn(rank, conv.in_channels, 3, 3) * 0.01
+        lora[f"{prefix}.lora_up.weight"] = torch.randn(conv.out_channels, rank, 1, 1) * 0.01
+        lora[f"{prefix}.alpha"] = torch.tensor(float(rank))
+        key_map[prefix] = f"convs.{index}.weight"
+    return (lora, key_map)
+
+
+def main():
+    args = parse_args("Benchmark the runtime LoRA mode against the merge path on CPU.", configure)
+    install_server_standin()
+
+    import torch
+    import comfy.model_patcher
+    loraStack = import_prepack("loraStack")
+    loraRuntime = import_prepack("loraRuntime")
+
+    torch.manual_seed(0)
+    model = build_model(torch, args)
+    lora, key_map = build_lora(torch, model, args.rank)
+    base = comfy.model_patcher.ModelPatcher(model, load_device=torch.device("cpu"), offload_device=torch.device("cpu"))
+    x = torch.randn(4, args.dim)
+    y = torch.randn(1, args.channels, 64, 64)
+    strengths = [0.25 + 0.25 * i for i in range(args.strengths)]
+
+    def run(patcher):
+        patcher.patch_model()
+        try:
+            with torch.no_grad():
+                for _ in range(args.steps):
+                    out = model(x, y)
+        finally:
+            patcher.unpatch_model()
+        return out
+
+    # Merge path: comfy patches, deltas computed and merged into the weights on every strength change
+    patches = loraStack.lora_patches(lora, key_map)
+    merge_outputs = []
+    start = time.perf_counter()
+    for strength in strengths:
+        patched = base.clone()
+        patched.add_patches(patches, strength)
+        merge_outputs.append(run(patched))
+    merge_time = time.perf_counter() - start
+
+    # Runtime path: adapters split once, each strength only rebuilds the forward wrappers
+    adapters, remainder = loraRuntime.split_low_rank(lora, key_map, model)
+    runtime_outputs = []
+    start = time.perf_counter()
+    for strength in strengths:
+        patched = base.clone()
+        loraRuntime._install(patched, model, {target: [(down, up, scale * strength)] for target, (down, up, scale) in adapters.items()})
+        runtime_outputs.append(run(patched))
+    runtime_time = time.perf_counter() - start
+
+    max_diff = max(
+        max((a - b).abs().max().item() for a, b in zip(merged, runtime))
+        for merged, runtime in zip(merge_outputs, runtime_outputs)
+    )
+    delta_bytes = sum(model.get_parameter(target).numel() * 4 for target in adapters)
+    adapter_bytes = sum((down.numel() + up.numel()) * 4 for down, up, _ in adapters.values())
+
+    print(f"layers: {args.linears} Linear({args.dim}) + {args.convs} Conv2d({args.channels}, 3x3), rank {args.rank}")
+    print(f"runtime adapters: {len(adapters)} of {len(key_map)} layers, {len(remainder)} tensors left to merge")
+    print(f"sweep of {len(strengths)} strengths x {args.steps} forward passes")
+    print(f"  merge:   {merge_time:.3f}s ({merge_time / len(strengths) * 1000:.1f} ms per strength), "
+          f"{delta_bytes / 1024**2:.1f} MB of weight deltas materialized per strength")
+    print(f"  runtime: {runtime_time:.3f}s ({runtime_time / len(strengths) * 1000:.1f} ms per strength), "
+          f"{adapter_bytes / 1024**2:.1f} MB of adapter weights, no deltas")
+    print(f"  speedup: {merge_time / runtime_time:.2f}x, max output difference {max_diff:.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+import os
+import time
+import asyncio
+import tempfile
+import statistics
+from _prepack import parse_args, install_server_standin, import_prepack
+
+"""Load test: PrepackLoras text routes against a local aiohttp stand-in server, measuring event-loop latency.
+
+Serves the real /prepack/lora-texts, /prepack/lora-text-content and /prepack/lora-texts-bulk handlers from
+a synthetic LoRA folder with a simulated network-share delay on every filesystem call, fires concurrent
+requests at them, and samples event-loop lag with a ticker task. The same load against a baseline route
+that does the filesystem work on the event loop shows what the off-loop routes avoid. Run with a ComfyUI
+checkout on the path:
+
+    python benchmarks/route_load_test.py --comfyui /path/to/ComfyUI
+"""
+
+
+TICK = 0.005
+
+
+def configure(parser):
+    parser.add_argument("--loras", type=int, default=200, help="Synthetic LoRA files to serve.")
+    parser.add_argument("--texts", type=int, default=4, help="Sidecar text documents per LoRA.")
+    parser.add_argument("--delay-ms", type=float, default=20.0, help="Simulated share latency per filesystem call.")
+    parser.add_argument("--requests", type=int, default=400, help="Requests per phase.")
+    parser.add_argument("--concurrency", type=int, default=32, help="Requests in flight at once.")
+    parser.add_argument("--port", type=int, default=0, help="Port to listen on (0 picks a free one).")
+
+
+def build_lora_folder(root, loras, texts):
+    names = []
+    for index in range(loras):
+        name = f"bench_lora_{index:04d}"
+        open(os.path.join(root, f"{name}.safetensors"), "wb").close()
+        os.makedirs(os.path.join(root, name))
+        for text_index in range(texts):
+            with open(os.path.join(root, name, f"prompt_{text_index}.txt"), "w", encoding="utf-8") as f:
+                f.write(f"trigger words for {name}, document {text_index}\n" * 8)
+        names.append(f"{name}.safetensors")
+    return names
+
+
+async def measure_lag(stop, samples):
+    """Record how late each TICK-second sleep wakes up; a blocked event loop shows up as large lags."""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(TICK)
+        samples.append(max(0.0, loop.time() - start - TICK))
+
+
+async def run_phase(session, base_url, paths, concurrency):
+    """Issue every request with at most concurrency in flight; return (per-request latencies, lag samples, wall time)."""
+    queue = asyncio.Queue()
+    for path in paths:
+        queue.put_nowait(path)
+    latencies = []
+    lag = []
+    stop = asyncio.Event()
+
+    async def client():
+        while not queue.empty():
+            method, path, body = queue.get_nowait()
+            start = time.perf_counter()
+            async with session.request(method, base_url + path, json=body) as response:
+                await response.read()
+                if response.status >= 400:
+                    raise RuntimeError(f"{method} {path} returned {response.status}")
+            latencies.append(time.perf_counter() - start)
+
+    ticker = asyncio.create_task(measure_lag(stop, lag))
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+    stop.set()
+    await ticker
+    return (latencies, lag, wall)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+def report(label, latencies, lag, wall):
+    print(f"  {label}: {len(latencies)} requests in {wall:.2f}s ({len(latencies) / wall:.0f} req/s), "
+          f"request p50 {percentile(latencies, 0.5) * 1000:.1f} ms, p99 {percentile(latencies, 0.99) * 1000:.1f} ms")
+    print(f"  {' ' * len(label)}  event-loop lag: mean {statistics.mean(lag or [0.0]) * 1000:.1f} ms, "
+          f"p99 {percentile(lag, 0.99) * 1000:.1f} ms, max {max(lag or [0.0]) * 1000:.1f} ms over {len(lag)} ticks")
+
+
+async def main_async(args, routes, loras, names):
+    from aiohttp import web, ClientSession, TCPConnector
+
+    delay = args.delay_ms / 1000.0
+
+    def slow(func):
+        # Every listing and read stats the share at least once
+        def wrapped(*call_args):
+            time.sleep(delay)
+            return func(*call_args)
+        return wrapped
+
+    loras.list_lora_texts = slow(loras.list_lora_texts)
+    loras.read_lora_text = slow(loras.read_lora_text)
+
+    async def blocking_lora_texts(request):
+        # Baseline: the same work done directly on the event loop
+        return web.json_response(loras.list_lora_texts(request.match_info["lora_name"])[0])
+
+    app = web.Application()
+    app.add_routes(routes)
+    app.router.add_get("/bench/blocking-lora-texts/{lora_name}", blocking_lora_texts)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", args.port)
+    await site.start()
+    port = runner.addresses[0][1]
+    base_url = f"http://127.0.0.1:{port}"
+
+    def mixed_paths(count):
+        paths = []
+        for index in range(count):
+            name = names[index % len(names)]
+            kind = index % 3
+            if kind == 0:
+                paths.append(("GET", f"/prepack/lora-texts/{name}", None))
+            elif kind == 1:
+                paths.append(("GET", f"/prepack/lora-text-content/{name}/prompt_{index % args.texts}.txt", None))
+            else:
+                batch = [{"lora_name": names[(index + offset) % len(names)], "text_names": ["prompt_0.txt"]} for offset in range(3)]
+                paths.append(("POST", "/prepack/lora-texts-bulk", {"loras": batch}))
+        return paths
+
+    print(f"{len(names)} LoRAs x {args.texts} texts, {args.delay_ms:.0f} ms simulated share latency, "
+          f"{args.requests} requests per phase, {args.concurrency} in flight")
+    print(f"route concurrency {loras.ROUTE_CONCURRENCY} per route")
+    try:
+        async with ClientSession(connector=TCPConnector(limit=args.concurrency)) as session:
+            # Idle reference: lag with no load at all
+            stop = asyncio.Event()
+            idle = []
+            ticker = asyncio.create_task(measure_lag(stop, idle))
+            await asyncio.sleep(1.0)
+            stop.set()
+            await ticker
+            print(f"  idle: event-loop lag p99 {percentile(idle, 0.99) * 1000:.1f} ms, max {max(idle or [0.0]) * 1000:.1f} ms")
+
+            report("prepack routes", *await run_phase(session, base_url, mixed_paths(args.requests), args.concurrency))
+            baseline = [("GET", f"/bench/blocking-lora-texts/{names[index % len(names)]}", None) for index in range(args.requests)]
+            report("blocking baseline", *await run_phase(session, base_url, baseline, args.concurrency))
+    finally:
+        await runner.cleanup()
+
+
+def main():
+    args = parse_args("Load-test the Prepack LoRA text routes and measure event-loop latency.", configure)
+    routes = install_server_standin()
+
+    import folder_paths
+    with tempfile.TemporaryDirectory(prefix="prepack_route_load_") as root:
+        names = build_lora_folder(root, args.loras, args.texts)
+        folder_paths.folder_names_and_paths["loras"] = ([root], {".safetensors"})
+        loras = import_prepack("loras")
+        asyncio.run(main_async(args, routes, loras, names))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import sys
+import time
+from _prepack import parse_args, import_prepack
+
+"""CPU check: Prepack tiled VAE decode against a full decode, within a tolerance.
+
+Decodes the same random latent with decode_samples in "full" and "tiled" mode (and chunked by batch) and
+reports the largest and mean pixel difference. By default it uses a small randomly initialized conv
+decoder with GroupNorm, run through comfy.utils.tiled_scale exactly like comfy's VAE; pass --vae to check
+a real VAE file instead. Exits non-zero when the mean difference exceeds --tolerance. Run with a ComfyUI
+checkout on the path:
+
+    python benchmarks/vae_tiled_check.py --comfyui /path/to/ComfyUI [--vae /path/to/vae.safetensors]
+"""
+
+
+def configure(parser):
+    parser.add_argument("--vae", default="", help="VAE file to check instead of the synthetic decoder.")
+    parser.add_argument("--size", type=int, default=768, help="Image size in pixels.")
+    parser.add_argument("--batch", type=int, default=2, help="Latents in the batch.")
+    parser.add_argument("--tile-size", type=int, default=256, help="Tile size in pixels.")
+    parser.add_argument("--overlap", type=int, default=64, help="Tile overlap in pixels.")
+    parser.add_argument("--tolerance", type=float, default=0.02, help="Largest allowed mean absolute difference (pixels in 0..1).")
+
+
+def synthetic_vae(torch):
+    import comfy.utils
+
+    class SyntheticVAE:
+        """Stand-in with comfy's VAE decode interface: 4-channel latent, 8x upscale, (B, H, W, C) output in 0..1."""
+
+        def __init__(self):
+            layers = [torch.nn.Conv2d(4, 64, 3, padding=1)]
+            for _ in range(3):
+                layers += [torch.nn.GroupNorm(8, 64), torch.nn.SiLU(), torch.nn.Upsample(scale_factor=2.0, mode="nearest"), torch.nn.Conv2d(64, 64, 3, padding=1)]
+            layers += [torch.nn.GroupNorm(8, 64), torch.nn.SiLU(), torch.nn.Conv2d(64, 3, 3, padding=1)]
+            self.decoder = torch.nn.Sequential(*layers).eval()
+
+        def _run(self, samples):
+            return torch.clamp((self.decoder(samples) + 1.0) / 2.0, 0.0, 1.0)
+
+        def spacial_compression_decode(self):
+            return 8
+
+        def decode(self, samples):
+            return self._run(samples).movedim(1, -1)
+
+        def decode_tiled(self, samples, tile_x=64, tile_y=64, overlap=16):
+            return comfy.utils.tiled_scale(samples, self._run, tile_x, tile_y, overlap, upscale_amount=8, out_channels=3, output_device="cpu").movedim(1, -1)
+
+    return SyntheticVAE()
+
+
+def main():
+    args = parse_args("Check that Prepack tiled VAE decoding matches a full decode on CPU.", configure)
+
+    import torch
+    vaeDecode = import_prepack("vaeDecode")
+
+    torch.manual_seed(0)
+    if args.vae:
+        import comfy.sd
+        import comfy.utils
+        vae = comfy.sd.VAE(sd=comfy.utils.load_torch_file(args.vae))
+        latent_channels = getattr(vae, "latent_channels", 4)
+    else:
+        vae = synthetic_vae(torch)
+        latent_channels = 4
+    latent = torch.randn(args.batch, latent_channels, args.size // 8, args.size // 8)
+
+    def timed(mode, batch_size=0):
+        start = time.perf_counter()
+        images = vaeDecode.decode_samples(vae, latent, mode, args.tile_size, args.overlap, batch_size)
+        return (images.float().cpu(), time.perf_counter() - start)
+
+    full, full_time = timed("full")
+    tiled, tiled_time = timed("tiled")
+    chunked, chunked_time = timed("full", batch_size=1)
+
+    diff = (full - tiled).abs()
+    chunk_diff = (full - chunked).abs().max().item()
+    print(f"{'VAE ' + args.vae if args.vae else 'synthetic decoder'}: {args.batch} x {args.size}px, "
+          f"tiles {args.tile_size}px with {args.overlap}px overlap")
+    print(f"  full:    {full_time:.2f}s, output {tuple(full.shape)}")
+    print(f"  tiled:   {tiled_time:.2f}s, max difference {diff.max().item():.4f}, mean {diff.mean().item():.5f}")
+    print(f"  chunked: {chunked_time:.2f}s, max difference {chunk_diff:.2e}")
+
+    failed = tuple(tiled.shape) != tuple(full.shape) or diff.mean().item() > args.tolerance or chunk_diff > 1e-4
+    print("FAIL" if failed else "OK", f"(mean tolerance {args.tolerance})")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,14 +3,8 @@ import { ComfyWidgets } from "../../../scripts/widgets.js";
 import { api } from "../../../scripts/api.js";
 
 const PREPACK_LORAS_NODE = "PrepackLoras";
-
-// Enhanced URI encoding for safe API calls
-function encodeURIComponent2(str) {
-    if (!str || typeof str !== 'string') {
-        return '';
-    }
-    return encodeURIComponent(str).replace(/[!'()*]/g, (c) => `%${c.charCodeAt(0).toString(16).toUpperCase()}`);
-}
+// Delay between compatibility requests while the server is still indexing LoRA headers
+const COMPAT_POLL_MS = 2000;
 
 // Sanitize text content to prevent XSS
 function sanitizeText(text) {
@@ -54,11 +48,121 @@ function showErrorNotification(message) {
     }
 }
 
+// Last bulk response per request body with its ETag, so unchanged LoRA texts come back as 304
+const BULK_CACHE_LIMIT = 64;
+const bulkCache = new Map();
+
+// Fetch text listings (and selected contents) for many LoRAs in a single request
+async function fetchLoraTexts(entries, timeoutMs = 10000) {
+    const controller = new AbortController();
+    const timeoutId = setTimeout(() => controller.abort(), timeoutMs);
+    const body = JSON.stringify({ loras: entries });
+    const cached = bulkCache.get(body);
+    
+    try {
+        const headers = { "Content-Type": "application/json" };
+        if (cached) {
+            headers["If-None-Match"] = cached.etag;
+        }
+        const response = await api.fetchApi("/prepack/lora-texts-bulk", {
+            method: "POST",
+            headers,
+            body,
+            signal: controller.signal
+        });
+        
+        if (response.status === 304 && cached) {
+            // Refresh recency so the most used requests stay cached
+            bulkCache.delete(body);
+            bulkCache.set(body, cached);
+            return cached.data;
+        }
+        if (!response.ok) {
+            throw new Error(`API request failed: ${response.status} ${response.statusText}`);
+        }
+        
+        const data = await response.json();
+        
+        // Validate response data
+        if (!data || typeof data !== 'object' || Array.isArray(data)) {
+            throw new Error('Invalid response format: expected object');
+        }
+        
+        const etag = response.headers.get("ETag");
+        bulkCache.delete(body);
+        if (etag) {
+            bulkCache.set(body, { etag, data });
+            if (bulkCache.size > BULK_CACHE_LIMIT) {
+                bulkCache.delete(bulkCache.keys().next().value);
+            }
+        }
+        return data;
+    } finally {
+        clearTimeout(timeoutId);
+    }
+}
+
+// Ask the server to start loading a selected LoRA into its cache; "None" cancels the slot's prefetch
+function prefetchLora(slot, loraName) {
+    api.fetchApi("/prepack/lora-prefetch", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ slot, lora_name: loraName || "None" })
+    }).catch(error => console.warn('LoRA prefetch request failed:', error));
+}
+
+// Narrow the LoRA name combos of a node to files whose headers match the model it last ran with
+async function filterLoraCombos(node, modelId) {
+    try {
+        const response = await api.fetchApi(`/prepack/lora-compat?model=${encodeURIComponent(modelId)}`);
+        if (!response.ok) {
+            throw new Error(`API request failed: ${response.status} ${response.statusText}`);
+        }
+        const data = await response.json();
+        if (!data || !data.filtered || !Array.isArray(data.loras)) {
+            return;
+        }
+        
+        const compatible = new Set(data.loras);
+        for (const widget of node.widgets || []) {
+            if (!/^lora_name_\d+$/.test(widget.name)) {
+                continue;
+            }
+            // Always filter from the full list so a later model can bring hidden LoRAs back
+            widget._prepackAllValues ??= widget.options.values;
+            widget.options.values = widget._prepackAllValues.filter(value => 
+                value === "None" || value === widget.value || compatible.has(value));
+        }
+        app.graph.setDirtyCanvas(true, true);
+        
+        // New LoRAs are indexed in the background; refine the filter once they are known
+        if (data.pending > 0) {
+            setTimeout(() => {
+                if (node._prepackModelId === modelId) {
+                    filterLoraCombos(node, modelId);
+                }
+            }, COMPAT_POLL_MS);
+        }
+    } catch (error) {
+        console.warn('Failed to filter LoRAs by model:', error);
+    }
+}
+
 app.registerExtension({
     name: "prepack.lora_texts",
     
     async beforeRegisterNodeDef(nodeType, nodeData, app) {
         if (nodeData.name === PREPACK_LORAS_NODE) {
+            const onExecuted = nodeType.prototype.onExecuted;
+            nodeType.prototype.onExecuted = function(message) {
+                onExecuted?.apply(this, arguments);
+                const modelId = message?.prepack_model?.[0];
+                if (modelId && modelId !== this._prepackModelId) {
+                    this._prepackModelId = modelId;
+                    filterLoraCombos(this, modelId);
+                }
+            };
+            
             const onAdded = nodeType.prototype.onAdded;
             nodeType.prototype.onAdded = function() {
                 onAdded?.apply(this, arguments);
@@ -121,7 +225,7 @@ app.registerExtension({
                 // Create text content display widget
                 let textContentWidget = null;
                 
-                const updateTextFiles = async (widgetData, preserveSelection = true) => {
+                const updateTextFiles = async (widgetData, preserveSelection = true, prefetchedFiles = null) => {
                     try {
                         const loraName = widgetData.name.value;
                         if (!loraName || loraName === "None") {
@@ -140,64 +244,50 @@ app.registerExtension({
                         // Store current selection before updating options
                         const currentSelection = preserveSelection ? widgetData.text.value : null;
                         
-                        // Fetch available text files with timeout
-                        const controller = new AbortController();
-                        const timeoutId = setTimeout(() => controller.abort(), 10000); // 10s timeout
+                        // Use listings from a bulk request when available, otherwise fetch this LoRA alone
+                        let textFiles = prefetchedFiles;
+                        if (!Array.isArray(textFiles)) {
+                            const data = await fetchLoraTexts([{ lora_name: loraName }]);
+                            textFiles = data[loraName]?.texts;
+                        }
                         
-                        try {
-                            const response = await api.fetchApi(`/prepack/lora-texts/${encodeURIComponent2(loraName)}`, {
-                                signal: controller.signal
-                            });
-                            
-                            clearTimeout(timeoutId);
-                            
-                            if (!response.ok) {
-                                throw new Error(`API request failed: ${response.status} ${response.statusText}`);
-                            }
+                        // Validate response data
+                        if (!Array.isArray(textFiles)) {
+                            throw new Error('Invalid response format: expected array');
+                        }
+                        
+                        if (textFiles.length > 0) {
+                            // Sanitize file names
+                            const sanitizedFiles = textFiles
+                                .filter(file => file && typeof file === 'string')
+                                .map(file => file.trim())
+                                .filter(file => file.length > 0);
                             
-                            const textFiles = await response.json();
+                            // Update combo options
+                            widgetData.combo.options.values = ["None", ...sanitizedFiles];
                             
-                            // Validate response data
-                            if (!Array.isArray(textFiles)) {
-                                throw new Error('Invalid response format: expected array');
-                            }
+                            // Determine which value to set
+                            let valueToSet = "None"; // Default to None
                             
-                            if (textFiles.length > 0) {
-                                // Sanitize file names
-                                const sanitizedFiles = textFiles
-                                    .filter(file => file && typeof file === 'string')
-                                    .map(file => file.trim())
-                                    .filter(file => file.length > 0);
-                                
-                                // Update combo options
-                                widgetData.combo.options.values = ["None", ...sanitizedFiles];
-                                
-                                // Determine which value to set
-                                let valueToSet = "None"; // Default to None
-                                
-                                if (preserveSelection && currentSelection !== null && currentSelection !== undefined) {
-                                    // Always preserve the current selection if it exists in the options
-                                    // This includes preserving "None" selection
-                                    if (currentSelection === "None" || sanitizedFiles.includes(currentSelection)) {
-                                        valueToSet = currentSelection;
-                                    }
-                                    // If the current selection is not available, keep default "None"
-                                } else if (!preserveSelection && sanitizedFiles.length > 0) {
-                                    // Only auto-select first file when explicitly requested (new node creation)
-                                    valueToSet = sanitizedFiles[0];
+                            if (preserveSelection && currentSelection !== null && currentSelection !== undefined) {
+                                // Always preserve the current selection if it exists in the options
+                                // This includes preserving "None" selection
+                                if (currentSelection === "None" || sanitizedFiles.includes(currentSelection)) {
+                                    valueToSet = currentSelection;
                                 }
-                                
-                                widgetData.combo.value = valueToSet;
-                                widgetData.text.value = valueToSet;
-                            } else {
-                                // No text files found
-                                widgetData.combo.options.values = ["None"];
-                                widgetData.combo.value = "None";
-                                widgetData.text.value = "None";
+                                // If the current selection is not available, keep default "None"
+                            } else if (!preserveSelection && sanitizedFiles.length > 0) {
+                                // Only auto-select first file when explicitly requested (new node creation)
+                                valueToSet = sanitizedFiles[0];
                             }
-                        } catch (fetchError) {
-                            clearTimeout(timeoutId);
-                            throw fetchError;
+                            
+                            widgetData.combo.value = valueToSet;
+                            widgetData.text.value = valueToSet;
+                        } else {
+                            // No text files found
+                            widgetData.combo.options.values = ["None"];
+                            widgetData.combo.value = "None";
+                            widgetData.text.value = "None";
                         }
                         
                         app.graph.setDirtyCanvas(true, true);
@@ -220,60 +310,58 @@ app.registerExtension({
                     }
                 };
                 
-                const updateTextContent = async () => {
+                const updateTextContent = async (prefetched = null) => {
                     try {
                         let allContents = [];
                         let errors = [];
                         
-                        // Collect content from all selected text files with parallel requests
-                        const contentPromises = comboWidgets.map(async (widgetData) => {
+                        // Collect the selected (LoRA, text) pairs
+                        const selections = [];
+                        for (const widgetData of comboWidgets) {
                             const loraName = widgetData.name.value;
                             const textName = widgetData.combo.value;
                             
                             if (!loraName || loraName === "None" || !textName || textName === "None") {
-                                return null;
+                                continue;
                             }
                             
                             // Validate inputs
                             if (typeof loraName !== 'string' || typeof textName !== 'string') {
                                 errors.push(`Invalid input types for ${loraName}/${textName}`);
-                                return null;
+                                continue;
                             }
-                            
-                            try {
-                                const controller = new AbortController();
-                                const timeoutId = setTimeout(() => controller.abort(), 8000); // 8s timeout
-                                
-                                const response = await api.fetchApi(
-                                    `/prepack/lora-text-content/${encodeURIComponent2(loraName)}/${encodeURIComponent2(textName)}`,
-                                    { signal: controller.signal }
-                                );
-                                
-                                clearTimeout(timeoutId);
-                                
-                                if (!response.ok) {
-                                    throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+                            selections.push({ loraName, textName });
+                        }
+                        
+                        if (selections.length > 0) {
+                            // Reuse contents from a bulk listing request, otherwise fetch every selection in one request
+                            let data = prefetched;
+                            const missing = !data || selections.some(({ loraName, textName }) => 
+                                data[loraName]?.contents?.[textName] === undefined);
+                            if (missing) {
+                                const entries = {};
+                                for (const { loraName, textName } of selections) {
+                                    (entries[loraName] ??= { lora_name: loraName, text_names: [] }).text_names.push(textName);
                                 }
-                                
-                                const content = await response.text();
-                                const trimmedContent = content.trim();
-                                
+                                try {
+                                    data = await fetchLoraTexts(Object.values(entries), 8000); // 8s timeout
+                                } catch (error) {
+                                    if (error.name !== 'AbortError') {
+                                        errors.push(`Error fetching text contents: ${error.message}`);
+                                    }
+                                    data = {};
+                                }
+                            }
+                            
+                            for (const { loraName, textName } of selections) {
+                                const content = data[loraName]?.contents?.[textName];
+                                const trimmedContent = typeof content === 'string' ? content.trim() : '';
                                 if (trimmedContent) {
                                     // Sanitize content to prevent XSS
-                                    return sanitizeText(trimmedContent);
-                                }
-                                return null;
-                            } catch (error) {
-                                if (error.name !== 'AbortError') {
-                                    errors.push(`Error fetching ${loraName}/${textName}: ${error.message}`);
+                                    allContents.push(sanitizeText(trimmedContent));
                                 }
-                                return null;
                             }
-                        });
-                        
-                        // Wait for all requests to complete
-                        const results = await Promise.all(contentPromises);
-                        allContents = results.filter(content => content !== null);
+                        }
                         
                         // Log errors if any
                         if (errors.length > 0) {
@@ -346,6 +434,8 @@ app.registerExtension({
                 
                 // Create debounced update functions for better performance
                 const debouncedUpdateTextFiles = debounce(async (widgetData, preserveSelection) => {
+                    // Warm the server-side LoRA cache while the user is still editing the graph
+                    prefetchLora(`${this.id}:${widgetData.index}`, widgetData.name.value);
                     await updateTextFiles(widgetData, preserveSelection);
                     await updateTextContent();
                 }, 300);
@@ -395,21 +485,38 @@ app.registerExtension({
                     this._loraTextCleanup.push(() => {
                         widgetData.name.callback = originalLoraCallback;
                         widgetData.combo.callback = originalComboCallback;
+                        prefetchLora(`${this.id}:${widgetData.index}`, "None");
                     });
                 }
                 
                 // Initialize all widgets with proper error handling
                 const initializeWidgets = async () => {
                     try {
+                        // Fetch listings and selected contents for every LoRA on the node in one request
+                        const entries = comboWidgets
+                            .filter(widgetData => widgetData.name.value && widgetData.name.value !== "None")
+                            .map(widgetData => ({
+                                lora_name: widgetData.name.value,
+                                text_names: widgetData.text.value && widgetData.text.value !== "None" ? [widgetData.text.value] : []
+                            }));
+                        let data = {};
+                        if (entries.length > 0) {
+                            try {
+                                data = await fetchLoraTexts(entries);
+                            } catch (error) {
+                                console.warn('Bulk LoRA text request failed, falling back to per-LoRA requests:', error);
+                            }
+                        }
+                        
                         for (const widgetData of comboWidgets) {
                             // On initialization, always preserve existing selection (including "None")
                             // Only auto-select first file if there's no existing value at all (undefined/null/empty)
                             const hasExistingSelection = widgetData.text.value !== undefined && 
                                                         widgetData.text.value !== null && 
                                                         widgetData.text.value !== "";
-                            await updateTextFiles(widgetData, hasExistingSelection);
+                            await updateTextFiles(widgetData, hasExistingSelection, data[widgetData.name.value]?.texts);
                         }
-                        await updateTextContent();
+                        await updateTextContent(data);
                     } catch (error) {
                         console.error('Error during widget initialization:', error);
                         showErrorNotification('Failed to initialize LoRA text widgets');
@@ -0,0 +1,171 @@
+import os
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from server import PromptServer
+from aiohttp import web
+
+"""Prepack cache utilities: byte-budgeted LRU caches shared across Prepack nodes."""
+
+
+# Registry of every named cache so they can be inspected and cleared over HTTP
+_CACHES = {}
+
+# Bounded pool for blocking filesystem work done by HTTP routes, so the PromptServer event loop never waits on disk
+IO_WORKERS = max(1, int(os.environ.get("PREPACK_IO_WORKERS", "4")))
+_IO_EXECUTOR = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="prepack_io")
+
+
+def env_megabytes(name, default_mb):
+    """Read a megabyte budget from the environment and return it in bytes."""
+    try:
+        return int(float(os.environ.get(name, default_mb)) * 1024 * 1024)
+    except (TypeError, ValueError):
+        print(f"Warning: Invalid value for {name}; using default of {default_mb} MB.")
+        return int(default_mb * 1024 * 1024)
+
+
+def file_signature(path):
+    """Return (resolved path, mtime_ns, size) so cache keys change when the file changes."""
+    real_path = os.path.realpath(path)
+    stat = os.stat(real_path)
+    return (real_path, stat.st_mtime_ns, stat.st_size)
+
+
+async def run_blocking(func, *args, limit=None):
+    """Run func(*args) on the shared I/O pool; limit is an optional asyncio.Semaphore capping a route's concurrency."""
+    loop = asyncio.get_running_loop()
+    if limit is None:
+        return await loop.run_in_executor(_IO_EXECUTOR, func, *args)
+    async with limit:
+        return await loop.run_in_executor(_IO_EXECUTOR, func, *args)
+
+
+class PrepackLRUCache:
+    """Thread-safe LRU cache that evicts least recently used entries beyond a byte budget."""
+
+    def __init__(self, name, max_bytes):
+        self.name = name
+        self.max_bytes = int(max_bytes)
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        _CACHES[name] = self
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, nbytes):
+        nbytes = int(nbytes)
+        with self._lock:
+            self._pop(key)
+            # Entries larger than the whole budget are never cached
+            if self.max_bytes <= 0 or nbytes > self.max_bytes:
+                return False
+            self._entries[key] = (value, nbytes)
+            self.current_bytes += nbytes
+            while self.current_bytes > self.max_bytes and self._entries:
+                self._evict_oldest()
+            return True
+
+    def __contains__(self, key):
+        # Membership test without touching LRU order or hit/miss counters
+        with self._lock:
+            return key in self._entries
+
+    def discard(self, key):
+        with self._lock:
+            return self._pop(key)
+
+    def discard_where(self, predicate):
+        """Drop every entry whose key matches predicate; returns the number removed."""
+        with self._lock:
+            stale = [key for key in self._entries if predicate(key)]
+            for key in stale:
+                self._pop(key)
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def set_max_bytes(self, max_bytes):
+        with self._lock:
+            self.max_bytes = int(max_bytes)
+            while self.current_bytes > max(self.max_bytes, 0) and self._entries:
+                self._evict_oldest()
+
+    def info(self):
+        with self._lock:
+            return {
+                "name": self.name,
+                "entries": len(self._entries),
+                "current_bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "keys": [repr(key) for key in self._entries],
+            }
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self.current_bytes -= entry[1]
+        return True
+
+    def _evict_oldest(self):
+        _, (_, nbytes) = self._entries.popitem(last=False)
+        self.current_bytes -= nbytes
+        self.evictions += 1
+
+
+def get_cache_info():
+    """Return statistics for every registered Prepack cache."""
+    return {name: cache.info() for name, cache in _CACHES.items()}
+
+
+def clear_caches(name=None):
+    """Clear one named cache, or all of them when name is None. Returns the cleared names."""
+    if name is None:
+        targets = list(_CACHES.values())
+    elif name in _CACHES:
+        targets = [_CACHES[name]]
+    else:
+        return []
+    for cache in targets:
+        cache.clear()
+    return [cache.name for cache in targets]
+
+
+# HTTP API routes for inspecting and clearing Prepack caches
+@PromptServer.instance.routes.get("/prepack/cache")
+async def get_prepack_cache_info(request):
+    """Get statistics for all Prepack caches"""
+    return web.json_response(get_cache_info())
+
+
+@PromptServer.instance.routes.post("/prepack/cache/clear")
+async def clear_prepack_cache(request):
+    """Clear a named Prepack cache (or all caches when no name is given)"""
+    name = request.query.get("name")
+    try:
+        if request.can_read_body:
+            body = await request.json()
+            name = body.get("name", name)
+    except Exception:
+        pass
+    return web.json_response({"cleared": clear_caches(name)})
@@ -0,0 +1,182 @@
+import os
+import time
+import threading
+import folder_paths
+
+"""Prepack file index: incrementally refreshed model/LoRA filename listings for INPUT_TYPES and HTTP routes."""
+
+
+# Minimum seconds between directory mtime checks for the same folder
+INDEX_TTL = float(os.environ.get("PREPACK_INDEX_TTL", "2.0"))
+
+# Matches folder_paths.recursive_search, which skips these directory names
+EXCLUDED_DIR_NAMES = (".git",)
+
+
+class _DirEntry:
+    __slots__ = ("mtime_ns", "files", "subdirs")
+
+    def __init__(self, mtime_ns, files, subdirs):
+        self.mtime_ns = mtime_ns
+        self.files = files
+        self.subdirs = subdirs
+
+
+class FolderIndex:
+    """Filename index for one folder_paths folder; only directories whose mtime changed are rescanned."""
+
+    def __init__(self, folder_name):
+        self.folder_name = folder_name
+        self.roots = ()
+        self.extensions = set()
+        self.dirs = {}
+        self.names = []
+        self.full_paths = {}
+        self.dir_mtimes = {}
+        self.last_check = 0.0
+        self._lock = threading.Lock()
+
+    def refresh(self, force=False):
+        with self._lock:
+            now = time.monotonic()
+            if not force and self.roots and now - self.last_check < INDEX_TTL:
+                return
+            self.last_check = now
+
+            roots, extensions = folder_paths.folder_names_and_paths[self.folder_name]
+            roots = tuple(roots)
+            if roots != self.roots or set(extensions) != self.extensions:
+                # Folder configuration changed: rebuild from scratch
+                self.roots = roots
+                self.extensions = set(extensions)
+                self.dirs = {}
+                changed = True
+                for root in roots:
+                    self._scan_tree(root)
+            else:
+                changed = False
+                for root in roots:
+                    changed = self._refresh_tree(root) or changed
+
+            if changed or not self.names:
+                self._rebuild_names()
+
+    def _scan_dir(self, path):
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+            files = []
+            subdirs = []
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=True):
+                        if entry.name not in EXCLUDED_DIR_NAMES:
+                            subdirs.append(entry.path)
+                    elif entry.is_file(follow_symlinks=True):
+                        files.append(entry.name)
+        except OSError:
+            self.dirs.pop(path, None)
+            return None
+        entry = _DirEntry(mtime_ns, files, subdirs)
+        self.dirs[path] = entry
+        return entry
+
+    def _scan_tree(self, path):
+        entry = self._scan_dir(path)
+        if entry is not None:
+            for subdir in entry.subdirs:
+                if subdir not in self.dirs:
+                    self._scan_tree(subdir)
+
+    def _drop_tree(self, path):
+        entry = self.dirs.pop(path, None)
+        if entry is not None:
+            for subdir in entry.subdirs:
+                self._drop_tree(subdir)
+
+    def _refresh_tree(self, path):
+        """Stat known directories and rescan only those that changed. Returns True if anything changed."""
+        entry = self.dirs.get(path)
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            if entry is not None:
+                self._drop_tree(path)
+                return True
+            return False
+
+        changed = False
+        if entry is None or entry.mtime_ns != mtime_ns:
+            old_subdirs = set(entry.subdirs) if entry is not None else set()
+            entry = self._scan_dir(path)
+            if entry is None:
+                return True
+            for removed in old_subdirs - set(entry.subdirs):
+                self._drop_tree(removed)
+            changed = True
+
+        for subdir in entry.subdirs:
+            if subdir in self.dirs:
+                changed = self._refresh_tree(subdir) or changed
+            else:
+                self._scan_tree(subdir)
+                changed = True
+        return changed
+
+    def _rebuild_names(self):
+        full_paths = {}
+        dir_mtimes = {}
+        for root in self.roots:
+            for path, entry in self.dirs.items():
+                if path != root and not path.startswith(os.path.join(root, "")):
+                    continue
+                for file_name in entry.files:
+                    full_path = os.path.join(path, file_name)
+                    relative_path = os.path.relpath(full_path, root)
+                    # Earlier roots take precedence, as in folder_paths.get_full_path
+                    if relative_path not in full_paths:
+                        full_paths[relative_path] = full_path
+                        dir_mtimes[relative_path] = entry.mtime_ns
+        self.names = folder_paths.filter_files_extensions(full_paths.keys(), self.extensions)
+        self.full_paths = full_paths
+        self.dir_mtimes = dir_mtimes
+
+
+_INDEXES = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+def _get_index(folder_name):
+    folder_name = getattr(folder_paths, "map_legacy", lambda name: name)(folder_name)
+    with _INDEXES_LOCK:
+        index = _INDEXES.get(folder_name)
+        if index is None:
+            index = _INDEXES[folder_name] = FolderIndex(folder_name)
+    index.refresh()
+    return index
+
+
+def get_filename_list(folder_name):
+    """Indexed replacement for folder_paths.get_filename_list."""
+    try:
+        return list(_get_index(folder_name).names)
+    except Exception as e:
+        print(f"Warning: Prepack file index failed for '{folder_name}': {str(e)}. Falling back to folder scan.")
+        return folder_paths.get_filename_list(folder_name)
+
+
+def get_indexed_files(folder_name):
+    """Return {name: (full path, mtime_ns of its directory)} for every listed file, without touching the files themselves."""
+    index = _get_index(folder_name)
+    with index._lock:
+        return {name: (index.full_paths[name], index.dir_mtimes[name]) for name in index.names}
+
+
+def get_full_path(folder_name, filename):
+    """Indexed replacement for folder_paths.get_full_path; returns None when the file is unknown."""
+    try:
+        full_path = _get_index(folder_name).full_paths.get(os.path.normpath(filename))
+        if full_path is not None and os.path.isfile(full_path):
+            return full_path
+    except Exception:
+        pass
+    return folder_paths.get_full_path(folder_name, filename)
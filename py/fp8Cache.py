@@ -0,0 +1,78 @@
+import os
+import glob
+import hashlib
+import re
+import torch
+import safetensors
+import safetensors.torch
+from .cacheUtils import file_signature
+
+"""Prepack fp8 cache: persist fp8-cast UNet weights on disk so later loads skip the full-precision read and cast."""
+
+
+# Opt-in: set PREPACK_FP8_CACHE_DIR to a writable directory to enable the cache
+FP8_CACHE_DIR = os.environ.get("PREPACK_FP8_CACHE_DIR", "")
+
+FP8_DTYPES = {
+    "fp8_e4m3fn": "float8_e4m3fn",
+    "fp8_e4m3fn_fast": "float8_e4m3fn",
+    "fp8_e5m2": "float8_e5m2",
+}
+CASTABLE_DTYPES = ("float32", "float16", "bfloat16")
+
+
+def cached_fp8_path(unet_path, weight_dtype):
+    """Return the fp8-cast copy of unet_path, writing it on first use; None when the cache does not apply."""
+    dtype_name = FP8_DTYPES.get(weight_dtype)
+    dtype = getattr(torch, dtype_name, None) if dtype_name else None
+    if not FP8_CACHE_DIR or dtype is None:
+        return None
+    if not unet_path.lower().endswith((".safetensors", ".sft")):
+        return None
+
+    real_path, mtime_ns, size = file_signature(unet_path)
+    source_hash = hashlib.sha256(f"{real_path}|{mtime_ns}|{size}".encode("utf-8")).hexdigest()[:24]
+    # Same-named UNets in different folders get separate copies: the source path is part of the stem
+    path_hash = hashlib.sha256(real_path.encode("utf-8")).hexdigest()[:8]
+    base = f"{os.path.splitext(os.path.basename(real_path))[0]}.{path_hash}"
+    cache_path = os.path.join(FP8_CACHE_DIR, f"{base}.{source_hash}.{dtype_name}.safetensors")
+    if os.path.isfile(cache_path):
+        return cache_path
+
+    try:
+        os.makedirs(FP8_CACHE_DIR, exist_ok=True)
+        _write_fp8_copy(unet_path, real_path, cache_path, dtype)
+        _remove_stale(base, dtype_name, cache_path)
+        return cache_path
+    except Exception as e:
+        print(f"Warning: Failed to write fp8 cache for '{unet_path}': {str(e)}. Loading from source.")
+        return None
+
+
+def _write_fp8_copy(source_path, real_path, cache_path, dtype):
+    cast = {}
+    with safetensors.safe_open(source_path, framework="pt", device="cpu") as f:
+        metadata = dict(f.metadata() or {})
+        for key in f.keys():
+            tensor = f.get_tensor(key)
+            # Only Linear/Conv weights are stored in fp8 by comfy ops; norms, biases and buffers keep their dtype
+            if key.endswith(".weight") and tensor.ndim >= 2 and str(tensor.dtype).replace("torch.", "") in CASTABLE_DTYPES:
+                tensor = tensor.to(dtype)
+            cast[key] = tensor.contiguous()
+
+    metadata["prepack_fp8_source"] = real_path
+    tmp_path = cache_path + ".tmp"
+    safetensors.torch.save_file(cast, tmp_path, metadata=metadata)
+    os.replace(tmp_path, cache_path)
+
+
+def _remove_stale(base, dtype_name, keep_path):
+    # Drop copies made from older versions of the same source file; base includes the source path hash
+    pattern = os.path.join(FP8_CACHE_DIR, f"{glob.escape(base)}.*.{dtype_name}.safetensors")
+    name_re = re.compile(re.escape(base) + r"\.[0-9a-f]{24}\." + re.escape(dtype_name) + r"\.safetensors$")
+    for path in glob.glob(pattern):
+        if path != keep_path and name_re.match(os.path.basename(path)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -4,10 +4,45 @@ import comfy.utils
 import comfy.sample
 import comfy.samplers
 import latent_preview
+from .vaeDecode import DECODE_MODES, decode_samples
+from .latentCache import latent_key, load_latent, store_latent
 
 """Prepack_Ksampler: sample latent and decode to image in one node."""
 
 
+# Samplers whose result for each latent does not depend on the rest of the batch: no noise drawn in the
+# loop and no batch-wide step size control (dpm_adaptive adapts its steps to the whole batch). Any other
+# sampler runs multi-seed batches one seed at a time, so its images match single-seed runs exactly
+BATCH_INDEPENDENT_SAMPLERS = frozenset((
+    "euler", "euler_cfg_pp", "heun", "heunpp2", "dpm_2", "lms", "dpm_fast", "dpmpp_2m", "dpmpp_2m_cfg_pp",
+    "ipndm", "ipndm_v", "deis", "res_multistep", "res_multistep_cfg_pp", "gradient_estimation",
+    "gradient_estimation_cfg_pp", "ddim", "uni_pc", "uni_pc_bh2",
+))
+
+
+# Samplers that re-noise masked latents with one random draw over the whole batch (comfy's ddim is euler
+# with random inpaint noise), so they are batch-independent only without a noise mask
+RANDOM_INPAINT_SAMPLERS = frozenset(("ddim",))
+
+
+def is_batch_independent(sampler_name, noise_mask=None):
+    if noise_mask is not None and sampler_name in RANDOM_INPAINT_SAMPLERS:
+        return False
+    return sampler_name in BATCH_INDEPENDENT_SAMPLERS
+
+
+def parse_seeds(seed, seed_list="", seed_count=1):
+    """Seeds to run: the explicit seed_list when given, otherwise seed_count consecutive seeds from seed."""
+    seeds = [int(value) for value in seed_list.replace(",", " ").split()]
+    if not seeds:
+        seeds = [(seed + i) % 0x10000000000000000 for i in range(max(int(seed_count), 1))]
+    return seeds
+
+
+def _repeat_batch(tensor, count):
+    return tensor.repeat((count,) + (1,) * (tensor.ndim - 1))
+
+
 class PrepackKsampler:
     @classmethod
     def INPUT_TYPES(s):
@@ -24,6 +59,14 @@ class PrepackKsampler:
                 "sampler_name": (comfy.samplers.KSampler.SAMPLERS, {"tooltip": "The algorithm used when sampling."}),
                 "scheduler": (comfy.samplers.KSampler.SCHEDULERS, {"tooltip": "The noise schedule applied during sampling."}),
                 "denoise": ("FLOAT", {"default": 1.0, "min": 0.0, "max": 1.0, "step": 0.01, "tooltip": "Relative denoising strength: 1.0 = full denoise; <1.0 = partial denoise (img2img)."}),
+            },
+            "optional": {
+                "decode_mode": (DECODE_MODES, {"default": "auto", "advanced": True, "tooltip": "'full' decodes the whole image at once, 'tiled' decodes in overlapping tiles to bound VRAM, 'auto' decodes in full and retries tiled when it runs out of memory. ComfyUI may itself retry a full decode tiled on out-of-memory, so 'full' does not guarantee an untiled decode."}),
+                "tile_size": ("INT", {"default": 512, "min": 64, "max": 4096, "step": 32, "advanced": True, "tooltip": "Tile size in pixels for tiled decoding."}),
+                "overlap": ("INT", {"default": 64, "min": 0, "max": 4096, "step": 32, "advanced": True, "tooltip": "Overlap in pixels between tiles; overlapping regions are blended to hide seams."}),
+                "decode_batch_size": ("INT", {"default": 0, "min": 0, "max": 4096, "advanced": True, "tooltip": "Latents decoded per VAE call; 0 decodes the whole batch at once. Smaller values bound decode memory for large batches."}),
+                "seed_list": ("STRING", {"default": "", "advanced": True, "tooltip": "Comma-separated seeds to sample in one run; each seed yields the same images as a separate run with that seed. Overrides seed and seed_count."}),
+                "seed_count": ("INT", {"default": 1, "min": 1, "max": 256, "advanced": True, "tooltip": "Number of consecutive seeds starting at seed to sample in one run."}),
             }
         }
 
@@ -38,7 +81,9 @@ class PrepackKsampler:
     CATEGORY = "💀Prepack"
     DESCRIPTION = "Run KSampler and then decode with VAE in a single node."
 
-    def sample_and_decode(self, model, positive, negative, vae, latent_image, seed, steps, cfg, sampler_name, scheduler, denoise=1.0):
+    def sample_and_decode(self, model, positive, negative, vae, latent_image, seed, steps, cfg, sampler_name, scheduler, denoise=1.0,
+                          decode_mode="auto", tile_size=512, overlap=64, decode_batch_size=0,
+                          seed_list="", seed_count=1):
         try:
             debug = os.environ.get("PREPACK_DEBUG") == "1"
             
@@ -54,10 +99,12 @@ class PrepackKsampler:
             else:
                 latent_info = "Unknown"
             
+            seeds = parse_seeds(seed, seed_list, seed_count)
+
             # Initialize sampling info
             info = {
                 "latent": latent_info,
-                "seed": str(seed),
+                "seed": ", ".join(str(s) for s in seeds),
                 "steps": str(steps),
                 "cfg": str(cfg),
                 "sampler_name": str(sampler_name),
@@ -81,23 +128,55 @@ class PrepackKsampler:
             if debug:
                 print(f"Latent samples shape: {latent_samples.shape}")
 
-            noise = comfy.sample.prepare_noise(latent_samples, seed, latent.get("batch_index", None))
+            batch_index = latent.get("batch_index", None)
             noise_mask = latent.get("noise_mask", None)
 
-            callback = latent_preview.prepare_callback(model, steps)
             disable_pbar = not comfy.utils.PROGRESS_BAR_ENABLED
 
-            samples = comfy.sample.sample(
-                model, noise, steps, cfg, sampler_name, scheduler, positive, negative, latent_samples,
-                denoise=denoise, disable_noise=False, start_step=None, last_step=None,
-                force_full_denoise=False, noise_mask=noise_mask, callback=callback,
-                disable_pbar=disable_pbar
-            )
-            if debug:
-                print(f"Samples shape: {samples.shape}")
+            def sample(noise, latent_samples, noise_mask):
+                return comfy.sample.sample(
+                    model, noise, steps, cfg, sampler_name, scheduler, positive, negative, latent_samples,
+                    denoise=denoise, disable_noise=False, start_step=None, last_step=None,
+                    force_full_denoise=False, noise_mask=noise_mask, callback=latent_preview.prepare_callback(model, steps),
+                    disable_pbar=disable_pbar
+                )
+
+            # Sampling groups of (seeds, latent, noise mask); each group is one sampler call
+            batch = latent_samples.shape[0]
+            independent = is_batch_independent(sampler_name, noise_mask)
+            if len(seeds) == 1 or independent:
+                # Per-seed noise stacked into one batched latent, in seed order
+                group_mask = noise_mask
+                if noise_mask is not None and noise_mask.shape[0] == batch and len(seeds) > 1:
+                    group_mask = _repeat_batch(noise_mask, len(seeds))
+                groups = [(seeds, _repeat_batch(latent_samples, len(seeds)) if len(seeds) > 1 else latent_samples, group_mask)]
+            else:
+                groups = [([s], latent_samples, noise_mask) for s in seeds]
+
+            total = batch * len(seeds)
+
+            # Skip sampling when the on-disk latent cache already holds this exact result
+            cache_key = latent_key(model, positive, negative, latent, node="ksampler", seed=tuple(seeds), steps=steps, cfg=cfg,
+                                   sampler_name=sampler_name, scheduler=scheduler, denoise=denoise)
+            samples = load_latent(cache_key)
+
+            if samples is not None:
+                if debug:
+                    print(f"Latent cache hit: {cache_key}")
+            else:
+                sampled = []
+                for group_seeds, group_latent, group_mask in groups:
+                    # Noise is drawn right before sampling, as in a single-seed run, so RNG state matches
+                    noises = [comfy.sample.prepare_noise(latent_samples, s, batch_index) for s in group_seeds]
+                    noise = noises[0] if len(noises) == 1 else torch.cat(noises)
+                    sampled.append(sample(noise, group_latent, group_mask))
+
+                samples = torch.cat(sampled) if len(sampled) > 1 else sampled[0]
+                store_latent(cache_key, samples)
+                if debug:
+                    print(f"Sampled {total} latents for {len(seeds)} seed(s) in {len(groups)} group(s)")
 
-            with torch.no_grad():
-                images = vae.decode(samples)
+            images = decode_samples(vae, samples, decode_mode, tile_size, overlap, decode_batch_size)
             if len(images.shape) == 5:
                 images = images.reshape(-1, images.shape[-3], images.shape[-2], images.shape[-1])
             if debug:
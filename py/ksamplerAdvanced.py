@@ -3,6 +3,7 @@ import comfy.samplers
 import comfy.sample
 import comfy.utils
 import latent_preview
+from .latentCache import latent_key, load_latent, store_latent
 
 """
 PrepackKsamplerAdvanced: 完全照抄 ComfyUI 原生 KSamplerAdvanced 實現
@@ -22,11 +23,18 @@ def common_ksampler(model, seed, steps, cfg, sampler_name, scheduler, positive,
     if "noise_mask" in latent:
         noise_mask = latent["noise_mask"]
 
-    callback = latent_preview.prepare_callback(model, steps)
-    disable_pbar = not comfy.utils.PROGRESS_BAR_ENABLED
-    samples = comfy.sample.sample(model, noise, steps, cfg, sampler_name, scheduler, positive, negative, latent_image,
-                                  denoise=denoise, disable_noise=disable_noise, start_step=start_step, last_step=last_step,
-                                  force_full_denoise=force_full_denoise, noise_mask=noise_mask, callback=callback, disable_pbar=disable_pbar, seed=seed)
+    # Prepack: return latents from the on-disk latent cache when every input is unchanged
+    cache_key = latent_key(model, positive, negative, latent, node="advanced", seed=seed, steps=steps, cfg=cfg,
+                           sampler_name=sampler_name, scheduler=scheduler, denoise=denoise, disable_noise=disable_noise,
+                           start_step=start_step, last_step=last_step, force_full_denoise=force_full_denoise)
+    samples = load_latent(cache_key)
+    if samples is None:
+        callback = latent_preview.prepare_callback(model, steps)
+        disable_pbar = not comfy.utils.PROGRESS_BAR_ENABLED
+        samples = comfy.sample.sample(model, noise, steps, cfg, sampler_name, scheduler, positive, negative, latent_image,
+                                      denoise=denoise, disable_noise=disable_noise, start_step=start_step, last_step=last_step,
+                                      force_full_denoise=force_full_denoise, noise_mask=noise_mask, callback=callback, disable_pbar=disable_pbar, seed=seed)
+        store_latent(cache_key, samples)
     out = latent.copy()
     out["samples"] = samples
     return (out, )
@@ -0,0 +1,171 @@
+import os
+import glob
+import hashlib
+import weakref
+import threading
+import torch
+import safetensors.torch
+from .cacheUtils import env_megabytes
+
+"""Prepack latent cache: content-addressed on-disk cache of sampled latents, keyed by everything that affects sampling."""
+
+
+# Opt-in: set PREPACK_LATENT_CACHE_DIR to a writable directory to enable the cache
+LATENT_CACHE_DIR = os.environ.get("PREPACK_LATENT_CACHE_DIR", "")
+LATENT_CACHE_BYTES = env_megabytes("PREPACK_LATENT_CACHE_MB", 4096)
+
+# Bump when the key layout changes so old entries are never matched
+KEY_VERSION = 1
+
+# ModelPatcher state made of callables and models that cannot be hashed; any entry disables the cache
+UNHASHED_PATCHER_STATE = ("wrappers", "callbacks", "hook_patches", "weight_wrapper_patches", "additional_models", "injections")
+
+# Tensor digests memoized per tensor object; LoRA and conditioning tensors are reused across runs.
+# Keyed by id() and dropped when the tensor is freed: WeakKeyDictionary compares keys with ==, which is
+# elementwise for tensors
+_DIGESTS = {}
+_EVICT_LOCK = threading.Lock()
+
+
+class Unfingerprintable(Exception):
+    """Raised when an input holds state (callbacks, control nets, ...) that cannot be hashed reliably."""
+
+
+def tensor_digest(tensor):
+    key = id(tensor)
+    digest = _DIGESTS.get(key)
+    if digest is None:
+        data = tensor.detach().to("cpu").contiguous()
+        hasher = hashlib.blake2b(f"{data.dtype}|{tuple(data.shape)}".encode("utf-8"), digest_size=16)
+        if data.numel() > 0:
+            hasher.update(data.reshape(-1).view(torch.uint8).numpy().tobytes())
+        digest = hasher.hexdigest()
+        _DIGESTS[key] = digest
+        weakref.finalize(tensor, _DIGESTS.pop, key, None)
+    return digest
+
+
+def fingerprint(value):
+    """Stable, hashable description of value; raises Unfingerprintable for anything it cannot describe."""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, torch.Tensor):
+        return ("tensor", tensor_digest(value))
+    if isinstance(value, (tuple, list)):
+        return tuple(fingerprint(item) for item in value)
+    if isinstance(value, (set, frozenset)):
+        return ("set",) + tuple(sorted(repr(fingerprint(item)) for item in value))
+    if isinstance(value, dict):
+        return ("dict",) + tuple(sorted((str(key), fingerprint(item)) for key, item in value.items()))
+    if isinstance(value, (torch.dtype, torch.device)):
+        return str(value)
+    if hasattr(value, "cache_fingerprint"):
+        return (type(value).__name__, fingerprint(value.cache_fingerprint()))
+    if isinstance(value, torch.nn.Module):
+        # Small modules such as model_sampling: buffers plus plain attributes (shift, multiplier, ...)
+        state = {key: item for key, item in vars(value).items() if not key.startswith("_") and key != "training"}
+        return (type(value).__name__, fingerprint(dict(value.state_dict())), fingerprint(state))
+    if type(value).__module__.startswith("comfy.weight_adapter"):
+        return (type(value).__name__, fingerprint(vars(value)))
+    raise Unfingerprintable(type(value).__name__)
+
+
+def _has_entries(value):
+    # wrappers and callbacks are nested {type: {key: [...]}} dicts that stay populated with empty containers
+    if isinstance(value, dict):
+        return any(_has_entries(item) for item in value.values())
+    if isinstance(value, (list, tuple, set)):
+        return len(value) > 0
+    return value is not None
+
+
+def model_fingerprint(model):
+    """Identity of a patched model: the loader's source id plus every weight patch, object patch and option."""
+    source = getattr(model.model, "prepack_source", None)
+    if source is None:
+        raise Unfingerprintable("model was not loaded by a Prepack loader")
+    for name in UNHASHED_PATCHER_STATE:
+        if _has_entries(getattr(model, name, None)):
+            raise Unfingerprintable(f"model has {name}")
+    patches = tuple(sorted((key, fingerprint(entries)) for key, entries in model.patches.items()))
+    object_patches = tuple(sorted((key, fingerprint(patch)) for key, patch in model.object_patches.items()))
+    return (source, patches, object_patches, fingerprint(model.model_options))
+
+
+def latent_key(model, positive, negative, latent, **params):
+    """Hex key for a sampling call, or None when some input cannot be fingerprinted (caching is skipped)."""
+    if not LATENT_CACHE_DIR:
+        return None
+    try:
+        parts = (
+            KEY_VERSION,
+            model_fingerprint(model),
+            fingerprint(positive),
+            fingerprint(negative),
+            fingerprint({key: latent.get(key) for key in ("samples", "noise_mask", "batch_index")}),
+            fingerprint(params),
+        )
+    except Unfingerprintable as e:
+        if os.environ.get("PREPACK_DEBUG") == "1":
+            print(f"Info: Latent cache skipped: {e}")
+        return None
+    return hashlib.sha256(repr(parts).encode("utf-8")).hexdigest()
+
+
+def _entry_path(key):
+    return os.path.join(LATENT_CACHE_DIR, f"{key}.safetensors")
+
+
+def load_latent(key):
+    """Return cached samples for key (memory-mapped), or None."""
+    if key is None:
+        return None
+    path = _entry_path(key)
+    if not os.path.isfile(path):
+        return None
+    try:
+        samples = safetensors.torch.load_file(path)["samples"]
+        # Refresh the mtime so eviction removes least recently used entries first
+        os.utime(path)
+        return samples
+    except Exception as e:
+        print(f"Warning: Ignoring unreadable latent cache entry '{path}': {str(e)}")
+        return None
+
+
+def store_latent(key, samples):
+    """Write samples for key and evict the oldest entries beyond PREPACK_LATENT_CACHE_MB."""
+    if key is None:
+        return
+    path = _entry_path(key)
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(LATENT_CACHE_DIR, exist_ok=True)
+        safetensors.torch.save_file({"samples": samples.detach().to("cpu").contiguous()}, temp_path)
+        os.replace(temp_path, path)
+    except Exception as e:
+        print(f"Warning: Could not write latent cache entry '{path}': {str(e)}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return
+    _evict()
+
+
+def _evict():
+    with _EVICT_LOCK:
+        entries = []
+        for path in glob.glob(os.path.join(LATENT_CACHE_DIR, "*.safetensors")):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= LATENT_CACHE_BYTES:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
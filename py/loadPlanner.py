@@ -0,0 +1,142 @@
+import os
+import json
+import struct
+import functools
+import folder_paths
+import torch
+import comfy.model_management
+from .cacheUtils import file_signature
+from .modelCache import unet_key, is_resident
+
+"""Prepack load planner: estimate model memory from safetensors headers and resolve "auto" loader options."""
+
+
+# Bytes per element for safetensors dtype tags
+DTYPE_SIZES = {
+    "F64": 8, "F32": 4, "F16": 2, "BF16": 2,
+    "F8_E4M3": 1, "F8_E5M2": 1,
+    "I64": 8, "I32": 4, "I16": 2, "I8": 1, "U8": 1, "BOOL": 1,
+}
+FLOAT_DTYPES = ("F64", "F32", "F16", "BF16", "F8_E4M3", "F8_E5M2")
+
+# Headroom kept free for activations and intermediate buffers
+RESERVE_BYTES = 1024 * 1024 * 1024
+
+# Resolved "auto" plans: {(file signatures, weight_dtype, device, torch device): (weight_dtype, device, summary)};
+# reused only while the planned UNet is resident
+_PLANS = {}
+
+
+def read_safetensors_header(path, with_metadata=False):
+    """Read only the JSON header of a safetensors file (no tensor data).
+
+    Returns the tensor entries, or (tensor entries, __metadata__ dict) when with_metadata is set.
+    """
+    header, metadata = _read_header(*file_signature(path))
+    return (header, metadata) if with_metadata else header
+
+
+@functools.lru_cache(maxsize=256)
+def _read_header(real_path, mtime_ns, size):
+    with open(real_path, "rb") as f:
+        header_len = struct.unpack("<Q", f.read(8))[0]
+        if header_len <= 0 or header_len > size - 8:
+            raise ValueError(f"Invalid safetensors header length in '{real_path}'")
+        header = json.loads(f.read(header_len))
+    metadata = header.pop("__metadata__", None) or {}
+    return (header, metadata)
+
+
+def estimate_file(path):
+    """Return {"bytes": {dtype: bytes}, "float_elements": n, "total": bytes} for a model file."""
+    if path is None or not os.path.isfile(path):
+        return {"bytes": {}, "float_elements": 0, "total": 0}
+    if not path.lower().endswith((".safetensors", ".sft")):
+        size = os.path.getsize(path)
+        return {"bytes": {"unknown": size}, "float_elements": size // 2, "total": size}
+
+    per_dtype = {}
+    float_elements = 0
+    for info in read_safetensors_header(path).values():
+        dtype = info.get("dtype")
+        start, end = info.get("data_offsets", (0, 0))
+        nbytes = end - start
+        per_dtype[dtype] = per_dtype.get(dtype, 0) + nbytes
+        if dtype in FLOAT_DTYPES:
+            float_elements += nbytes // DTYPE_SIZES[dtype]
+    return {"bytes": per_dtype, "float_elements": float_elements, "total": sum(per_dtype.values())}
+
+
+def _loaded_bytes(estimate, bytes_per_float):
+    # Float weights are cast on load; non-float tensors keep their stored size
+    non_float = sum(nbytes for dtype, nbytes in estimate["bytes"].items() if dtype not in FLOAT_DTYPES and dtype != "unknown")
+    return estimate["float_elements"] * bytes_per_float + non_float
+
+
+def _available_memory():
+    """Return (free VRAM, free RAM) in bytes; VRAM equals RAM when running on CPU."""
+    ram = comfy.model_management.get_free_memory(torch.device("cpu"))
+    device = comfy.model_management.get_torch_device()
+    if device.type == "cpu":
+        return (ram, ram)
+    return (comfy.model_management.get_free_memory(device), ram)
+
+
+def _plan_key(paths, weight_dtype, device):
+    signatures = tuple(file_signature(path) if path and os.path.isfile(path) else path for path in paths)
+    return (signatures, weight_dtype, device, str(comfy.model_management.get_torch_device()))
+
+
+def plan_load(unet_name, clip_names, vae_name, weight_dtype, device, loaded_unet=None):
+    """Resolve "auto" weight_dtype/device values before any weights are read.
+
+    Returns (weight_dtype, device, summary) where summary is a printable description of the plan.
+    A plan is reused while the UNet it planned is still resident (in loaded_unet, the node's slot, or
+    the model cache): re-measuring free memory then would count that UNet against itself and could flip
+    to a different weight_dtype, loading a second copy. Once it is gone, memory is measured again.
+    """
+    unet_path = folder_paths.get_full_path_or_raise("diffusion_models", unet_name)
+    clip_paths = [folder_paths.get_full_path_or_raise("text_encoders", name) for name in clip_names]
+    vae_path = folder_paths.get_full_path("vae", vae_name)
+    key = _plan_key([unet_path] + clip_paths + [vae_path], weight_dtype, device)
+    plan = _PLANS.get(key)
+    if plan is not None and is_resident(unet_key(unet_path, plan[0]), loaded_unet):
+        return (plan[0], plan[1], f"{plan[2]} (reused)")
+
+    plan = _plan(unet_path, clip_paths, vae_path, weight_dtype, device)
+    _PLANS[key] = plan
+    return plan
+
+
+def _plan(unet_path, clip_paths, vae_path, weight_dtype, device):
+    unet = estimate_file(unet_path)
+    clips = [estimate_file(path) for path in clip_paths]
+    vae = estimate_file(vae_path)
+
+    vram, ram = _available_memory()
+    unet_default = _loaded_bytes(unet, 2)
+    unet_fp8 = _loaded_bytes(unet, 1)
+    clip_bytes = sum(_loaded_bytes(clip, 2) for clip in clips)
+    vae_bytes = _loaded_bytes(vae, 2)
+
+    if weight_dtype == "auto":
+        weight_dtype = "default"
+        if hasattr(torch, "float8_e4m3fn"):
+            if unet_default + RESERVE_BYTES > vram or unet_default + clip_bytes + vae_bytes > ram:
+                weight_dtype = "fp8_e4m3fn"
+    unet_bytes = unet_fp8 if weight_dtype.startswith("fp8") else unet_default
+
+    if device == "auto":
+        # Keep CLIP on the GPU only when it fits next to the UNet and VAE
+        remaining = vram - unet_bytes - vae_bytes - RESERVE_BYTES
+        device = "default" if clip_bytes <= remaining else "cpu"
+
+    total = unet_bytes + clip_bytes + vae_bytes
+    if total > ram + vram:
+        print(f"Warning: Estimated model memory {total / 1024**3:.2f} GB exceeds free RAM+VRAM "
+              f"({(ram + vram) / 1024**3:.2f} GB); loading may run out of memory.")
+
+    summary = (f"unet {unet_bytes / 1024**3:.2f} GB, clip {clip_bytes / 1024**3:.2f} GB, "
+               f"vae {vae_bytes / 1024**3:.2f} GB, free VRAM {vram / 1024**3:.2f} GB, "
+               f"free RAM {ram / 1024**3:.2f} GB -> weight_dtype={weight_dtype}, device={device}")
+    return (weight_dtype, device, summary)
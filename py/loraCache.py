@@ -0,0 +1,154 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import safetensors
+import comfy.utils
+from .cacheUtils import PrepackLRUCache, env_megabytes, file_signature
+
+"""Prepack LoRA cache: process-wide LRU of LoRA state dicts shared by all Prepack LoRA nodes."""
+
+
+LORA_CACHE = PrepackLRUCache("loras", env_megabytes("PREPACK_LORA_CACHE_MB", 2048))
+
+# Number of LoRA files read concurrently when a node applies a stack
+LOAD_WORKERS = int(os.environ.get("PREPACK_LORA_LOAD_WORKERS", "4"))
+
+# Key prefixes of text-encoder tensors across kohya, diffusers and comfy LoRA formats
+TEXT_ENCODER_PREFIXES = ("lora_te", "lora_prior_te", "text_encoder", "text_encoders.")
+
+# Which tensors of a LoRA file to load: everything, only diffusion-model keys, or only text-encoder keys
+LORA_PARTS = ("all", "unet", "clip")
+
+# Background reads started from UI selections, one in flight per widget slot
+_PREFETCH_EXECUTOR = ThreadPoolExecutor(max_workers=max(1, int(os.environ.get("PREPACK_LORA_PREFETCH_WORKERS", "1"))), thread_name_prefix="prepack_prefetch")
+_PREFETCH_LOCK = threading.Lock()
+_PREFETCHES = {}
+
+
+def state_dict_bytes(sd):
+    return sum(t.numel() * t.element_size() for t in sd.values() if hasattr(t, "element_size"))
+
+
+def is_text_encoder_key(key):
+    return key.startswith(TEXT_ENCODER_PREFIXES)
+
+
+def lora_part(has_model, has_clip):
+    """Pick the part of a LoRA file that the targets actually use."""
+    if has_model and not has_clip:
+        return "unet"
+    if has_clip and not has_model:
+        return "clip"
+    return "all"
+
+
+def _key_in_part(key, part):
+    if part == "unet":
+        return not is_text_encoder_key(key)
+    if part == "clip":
+        return is_text_encoder_key(key)
+    return True
+
+
+def _read_lora_part(lora_path, part, cancel=None):
+    """Read only the tensors of one part through the safetensors mmap; other formats are loaded in full.
+
+    Safetensors reads check the optional cancel event between tensors and return None once it is set.
+    """
+    if (part == "all" and cancel is None) or not lora_path.lower().endswith((".safetensors", ".sft")):
+        lora = comfy.utils.load_torch_file(lora_path, safe_load=True)
+        return {k: v for k, v in lora.items() if _key_in_part(k, part)}
+    lora = {}
+    with safetensors.safe_open(lora_path, framework="pt", device="cpu") as f:
+        for k in f.keys():
+            if cancel is not None and cancel.is_set():
+                return None
+            if _key_in_part(k, part):
+                lora[k] = f.get_tensor(k)
+    return lora
+
+
+def load_lora_file(lora_path, part="all", cancel=None):
+    """Load a LoRA state dict through the shared cache; entries are invalidated when the file's mtime or size changes.
+
+    part="unet" or "clip" reads only the tensors used by that target (e.g. no text-encoder weights when
+    the LoRA is applied to the diffusion model alone).
+    """
+    signature = file_signature(lora_path)
+    lora = LORA_CACHE.get(signature + (part,))
+    if lora is None and part != "all":
+        # A cached full state dict already holds every part
+        full = LORA_CACHE.get(signature + ("all",))
+        if full is not None:
+            return {k: v for k, v in full.items() if _key_in_part(k, part)}
+    if lora is None:
+        # Drop entries for older versions of this file before loading the new one
+        LORA_CACHE.discard_where(lambda key: key[0] == signature[0] and key[:3] != signature)
+        lora = _read_lora_part(lora_path, part, cancel)
+        if lora is None:
+            return None
+        LORA_CACHE.put(signature + (part,), lora, state_dict_bytes(lora))
+    return lora
+
+
+def load_lora_files(requests):
+    """Read several (lora_path, part) requests concurrently; returns [(state_dict, error)] in input order."""
+    def load(request):
+        try:
+            return (load_lora_file(*request), None)
+        except Exception as e:
+            return (None, e)
+
+    unique_requests = list(dict.fromkeys(requests))
+    if len(unique_requests) <= 1 or LOAD_WORKERS <= 1:
+        results = {request: load(request) for request in unique_requests}
+    else:
+        with ThreadPoolExecutor(max_workers=min(LOAD_WORKERS, len(unique_requests)), thread_name_prefix="prepack_lora") as pool:
+            results = dict(zip(unique_requests, pool.map(load, unique_requests)))
+    return [results[request] for request in requests]
+
+
+def prefetch_lora_file(slot, lora_path):
+    """Start reading a LoRA into the shared cache in the background; returns "cached", "queued" or "skipped".
+
+    A new request for the same slot (e.g. a widget whose selection changed again) cancels the previous
+    prefetch. Files that do not fit the cache budget are never prefetched. lora_path None only cancels.
+    """
+    status = "skipped"
+    signature = file_signature(lora_path) if lora_path is not None else None
+    if signature is not None and signature + ("all",) in LORA_CACHE:
+        status = "cached"
+    elif signature is not None and 0 < signature[2] <= LORA_CACHE.max_bytes:
+        status = "queued"
+
+    cancel = threading.Event()
+
+    def prefetch():
+        if cancel.is_set():
+            return
+        try:
+            load_lora_file(lora_path, "all", cancel)
+        except Exception as e:
+            print(f"Warning: Failed to prefetch LoRA '{lora_path}': {str(e)}")
+
+    with _PREFETCH_LOCK:
+        previous = _PREFETCHES.get(slot)
+        if previous is not None:
+            # Re-selecting the file that is already loading keeps the running read
+            if status == "queued" and previous[2] == lora_path and not previous[0].done():
+                return status
+            del _PREFETCHES[slot]
+            previous[1].set()
+            previous[0].cancel()
+        if status != "queued":
+            return status
+        future = _PREFETCH_EXECUTOR.submit(prefetch)
+        _PREFETCHES[slot] = (future, cancel, lora_path)
+
+    def forget(_):
+        with _PREFETCH_LOCK:
+            if _PREFETCHES.get(slot, (None,))[0] is future:
+                del _PREFETCHES[slot]
+
+    future.add_done_callback(forget)
+    return status
@@ -0,0 +1,288 @@
+import os
+import re
+import json
+import threading
+from collections import deque
+import folder_paths
+from .cacheUtils import file_signature
+from .loadPlanner import read_safetensors_header
+
+"""Prepack LoRA index: persistent per-file header facts used to check LoRA/model compatibility before any tensor I/O."""
+
+
+# What to do with a LoRA that matches none of the model's layers: "warn", "skip" or "off"
+COMPAT_MODE = os.environ.get("PREPACK_LORA_COMPAT", "warn").strip().lower()
+
+# Module names kept per LoRA for compatibility checks; enough to be representative, small enough to persist
+SAMPLE_MODULES = 32
+
+# Tensor name suffixes that follow the module name in LoRA, LoCon, LoHa, LoKr, DoRA and diff formats
+MODULE_SUFFIX_RE = re.compile(
+    r"(\.lora[._]|_lora\.|\.alpha$|\.dora_scale$|\.hada_|\.lokr_|\.diff(_b)?$"
+    r"|\.oft_|\.set_weight$|\.reshape_weight$|\.[wb]_norm$|\.rescale$)"
+)
+
+# Tensor names of the down projection, whose first dimension is the LoRA rank
+DOWN_SUFFIXES = (".lora_down.weight", "_lora.down.weight", ".lora_A.weight", ".lora.down.weight", ".lora_A", ".lora_linear_layer.down.weight")
+
+# Background indexing writes the index after this many files, so progress survives a restart
+SAVE_EVERY = 256
+
+# Safetensors metadata fields naming the base model a LoRA was trained for
+ARCH_METADATA_KEYS = ("modelspec.architecture", "ss_base_model_version", "ss_sd_model_name")
+
+
+def is_indexable(lora_path):
+    return lora_path.lower().endswith((".safetensors", ".sft"))
+
+
+def _index_path():
+    path = os.environ.get("PREPACK_LORA_INDEX")
+    if path:
+        return path
+    get_user_directory = getattr(folder_paths, "get_user_directory", None)
+    root = get_user_directory() if get_user_directory is not None else os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(root, "prepack_lora_index.json")
+
+
+def module_name(tensor_name):
+    """Return the module prefix of a LoRA tensor name, or None for tensors that are not per-module weights."""
+    match = MODULE_SUFFIX_RE.search(tensor_name)
+    return tensor_name[:match.start()] if match else None
+
+
+def _key_prefix(module):
+    # kohya names are underscore-joined ("lora_unet_...", "lora_te1_..."); other formats use dotted paths
+    if module.startswith("lora_"):
+        return "_".join(module.split("_")[:2])
+    return module.split(".")[0]
+
+
+def guess_architecture(modules, metadata):
+    """Best-effort base model family of a LoRA, from its metadata first and its module names otherwise."""
+    for key in ARCH_METADATA_KEYS:
+        value = metadata.get(key)
+        if value:
+            return str(value)
+    names = " ".join(modules)
+    if "double_blocks" in names or "single_blocks" in names or "single_transformer_blocks" in names:
+        return "flux"
+    if "joint_blocks" in names:
+        return "sd3"
+    if "input_blocks" in names or "down_blocks" in names:
+        return "sdxl" if ("lora_te2" in names or "text_encoder_2" in names) else "sd1"
+    if "transformer_blocks" in names:
+        return "dit"
+    return "unknown"
+
+
+def read_lora_facts(lora_path):
+    """Header facts of one LoRA file: byte size, rank, key prefixes, architecture and a module sample."""
+    header, metadata = read_safetensors_header(lora_path, with_metadata=True)
+    modules = set()
+    rank = 0
+    for name, info in header.items():
+        module = module_name(name)
+        if module is not None:
+            modules.add(module)
+        if name.endswith(DOWN_SUFFIXES) and info.get("shape"):
+            rank = max(rank, int(info["shape"][0]))
+
+    modules = sorted(modules)
+    # Evenly spaced sample so every block of the network is represented
+    step = max(1, len(modules) // SAMPLE_MODULES)
+    sample = modules[::step][:SAMPLE_MODULES]
+    prefixes = sorted({_key_prefix(module) for module in modules})
+    return {
+        "size": os.path.getsize(lora_path),
+        "rank": rank,
+        "prefixes": prefixes,
+        "architecture": guess_architecture(modules, metadata),
+        "modules": len(modules),
+        "sample": sample,
+    }
+
+
+class LoraIndex:
+    """JSON-backed index of LoRA header facts; an entry is recomputed only when the file's mtime or size changes.
+
+    Entries are keyed by the LoRA path as listed. Combo filtering reads them without any filesystem
+    access and hands new files, and files in directories that changed, to one background thread.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = None
+        self.dirty = False
+        self._lock = threading.Lock()
+        self._pending = deque()
+        self._queued = {}
+        self._unreadable = set()
+        self._worker = None
+
+    def _load(self):
+        if self.entries is not None:
+            return
+        self.entries = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                self.entries = data
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Warning: Ignoring unreadable LoRA index '{self.path}': {str(e)}")
+
+    def facts(self, lora_path):
+        """Return the header facts of a safetensors LoRA, or None for other formats and unreadable files."""
+        if not is_indexable(lora_path):
+            return None
+        key = os.path.abspath(lora_path)
+        try:
+            real_path, mtime_ns, size = file_signature(lora_path)
+        except OSError:
+            return None
+        with self._lock:
+            self._load()
+            entry = self.entries.get(key)
+            if entry is not None and entry.get("mtime_ns") == mtime_ns and entry.get("size") == size:
+                return entry
+        try:
+            entry = read_lora_facts(real_path)
+        except Exception as e:
+            print(f"Warning: Could not index LoRA '{lora_path}': {str(e)}")
+            return None
+        entry["mtime_ns"] = mtime_ns
+        with self._lock:
+            self.entries[key] = entry
+            self.dirty = True
+        return entry
+
+    def cached(self, lora_path, dir_mtime_ns):
+        """Return (entry, current) from memory only; current is False when the file is new or its directory changed."""
+        with self._lock:
+            self._load()
+            entry = self.entries.get(os.path.abspath(lora_path))
+        return (entry, entry is not None and entry.get("dir_mtime_ns") == dir_mtime_ns)
+
+    def index_in_background(self, files):
+        """Queue {lora_path: dir_mtime_ns} for the background indexer; returns the number of files still pending."""
+        with self._lock:
+            for lora_path, dir_mtime_ns in files.items():
+                if lora_path in self._queued or (lora_path, dir_mtime_ns) in self._unreadable:
+                    continue
+                self._queued[lora_path] = dir_mtime_ns
+                self._pending.append(lora_path)
+            if self._pending and (self._worker is None or not self._worker.is_alive()):
+                self._worker = threading.Thread(target=self._index_pending, name="prepack_lora_index", daemon=True)
+                self._worker.start()
+            return len(self._queued)
+
+    def _index_pending(self):
+        indexed = 0
+        while True:
+            with self._lock:
+                if not self._pending:
+                    break
+                lora_path = self._pending.popleft()
+                dir_mtime_ns = self._queued[lora_path]
+            # Stats the file; the header is read again only when its mtime or size changed
+            entry = self.facts(lora_path)
+            with self._lock:
+                if entry is None:
+                    self._unreadable.add((lora_path, dir_mtime_ns))
+                elif entry.get("dir_mtime_ns") != dir_mtime_ns:
+                    entry["dir_mtime_ns"] = dir_mtime_ns
+                    self.dirty = True
+                del self._queued[lora_path]
+            indexed += 1
+            if indexed % SAVE_EVERY == 0:
+                self.save()
+        self.save()
+
+    def prune(self, live_paths):
+        """Drop entries for LoRAs that are no longer listed; live_paths comes from the file index, so nothing is stat'ed."""
+        live = {os.path.abspath(path) for path in live_paths}
+        with self._lock:
+            self._load()
+            stale = [key for key in self.entries if key not in live]
+            for key in stale:
+                del self.entries[key]
+            if stale:
+                self.dirty = True
+
+    def save(self):
+        """Write the index if it changed."""
+        with self._lock:
+            if not self.dirty:
+                return
+            data = json.dumps(self.entries, separators=(",", ":"))
+            self.dirty = False
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            temp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            print(f"Warning: Could not save LoRA index '{self.path}': {str(e)}")
+
+
+LORA_INDEX = LoraIndex(_index_path())
+
+
+def matched_modules(facts, key_map):
+    """Number of sampled LoRA modules that the model's key map knows; 0 means the LoRA targets another model."""
+    return sum(1 for module in facts["sample"] if module in key_map)
+
+
+def is_compatible(lora_path, key_map):
+    """True unless the index shows that none of the LoRA's sampled modules exist in key_map."""
+    facts = LORA_INDEX.facts(lora_path)
+    if facts is None or not facts["sample"] or not key_map:
+        return True
+    return matched_modules(facts, key_map) > 0
+
+
+def check_loras(resolved, key_map):
+    """Filter resolved LoRAs by compatibility according to PREPACK_LORA_COMPAT; warns about every mismatch."""
+    if COMPAT_MODE == "off":
+        return resolved
+    kept = []
+    for entry in resolved:
+        lora_name, lora_path = entry[0], entry[1]
+        if is_compatible(lora_path, key_map):
+            kept.append(entry)
+            continue
+        facts = LORA_INDEX.facts(lora_path)
+        action = "Skipping this LoRA" if COMPAT_MODE == "skip" else "Applying it anyway"
+        print(f"Warning: LoRA '{lora_name}' ({facts['architecture']}) matches no layers of the connected model. {action}.")
+        if COMPAT_MODE != "skip":
+            kept.append(entry)
+    LORA_INDEX.save()
+    return kept
+
+
+def compatible_lora_names(files, key_map):
+    """Filter {lora_name: (lora_path, dir_mtime_ns)} by indexed modules without touching the LoRA files.
+
+    Returns (names, pending). New files and files in changed directories are indexed in the background;
+    until then they keep their previous entry, or are kept unfiltered when they have none.
+    """
+    names = []
+    stale = {}
+    for lora_name, (lora_path, dir_mtime_ns) in files.items():
+        if not is_indexable(lora_path):
+            names.append(lora_name)
+            continue
+        entry, current = LORA_INDEX.cached(lora_path, dir_mtime_ns)
+        if not current:
+            stale[lora_path] = dir_mtime_ns
+        if entry is None or not entry["sample"] or not key_map or matched_modules(entry, key_map) > 0:
+            names.append(lora_name)
+    LORA_INDEX.prune(lora_path for lora_path, _ in files.values())
+    pending = LORA_INDEX.index_in_background(stale) if stale else 0
+    if not pending:
+        LORA_INDEX.save()
+    return (names, pending)
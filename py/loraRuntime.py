@@ -0,0 +1,180 @@
+import torch
+import torch.nn.functional as F
+import comfy.lora
+import comfy.utils
+from .loraStack import (
+    STACK_CACHE, stack_fingerprint, lora_key_map, convert_lora, add_patch_sets,
+    resolve_loras, load_resolved,
+)
+
+"""Prepack LoRA runtime: apply LoRAs as forward-time low-rank adapters instead of merging weight deltas."""
+
+
+# (up, down) tensor name patterns for plain low-rank LoRAs, matching comfy.lora.load_lora
+LOW_RANK_NAMES = (
+    ("{}.lora_up.weight", "{}.lora_down.weight"),
+    ("{}_lora.up.weight", "{}_lora.down.weight"),
+    ("{}.lora_B.weight", "{}.lora_A.weight"),
+    ("{}.lora.up.weight", "{}.lora.down.weight"),
+    ("{}.lora_B", "{}.lora_A"),
+    ("{}.lora_linear_layer.up.weight", "{}.lora_linear_layer.down.weight"),
+)
+
+
+class LowRankForward:
+    """Replacement forward for a Linear/Conv2d module: base(x) + sum(scale * up(down(x)))."""
+
+    def __init__(self, module, base_forward, adapters):
+        self.module = module
+        self.base_forward = base_forward
+        self.adapters = adapters
+        self.is_conv = isinstance(module, torch.nn.Conv2d)
+        self._cast = {}
+
+    def _weights(self, x):
+        # Keep one copy of the adapter weights per (device, dtype) instead of casting every step
+        key = (x.device, x.dtype)
+        weights = self._cast.get(key)
+        if weights is None:
+            weights = [(down.to(x.device, x.dtype), up.to(x.device, x.dtype), scale) for down, up, scale in self.adapters]
+            self._cast[key] = weights
+        return weights
+
+    def cache_fingerprint(self):
+        # Adapters plus any wrapper this one chains onto; the base forward itself is part of the model
+        chained = self.base_forward if isinstance(self.base_forward, LowRankForward) else None
+        return (self.adapters, chained)
+
+    def __call__(self, x, *args, **kwargs):
+        out = self.base_forward(x, *args, **kwargs)
+        for down, up, scale in self._weights(x):
+            if self.is_conv:
+                hidden = F.conv2d(x, down, None, self.module.stride, self.module.padding, self.module.dilation)
+                delta = F.conv2d(hidden, up)
+            else:
+                delta = F.linear(F.linear(x, down), up)
+            out = out + (delta * scale).to(out.dtype)
+        return out
+
+
+def _supported_module(root, target):
+    if not isinstance(target, str) or not target.endswith(".weight"):
+        return None
+    try:
+        module = comfy.utils.get_attr(root, target[:-len(".weight")])
+    except AttributeError:
+        return None
+    if isinstance(module, torch.nn.Linear):
+        return module
+    if isinstance(module, torch.nn.Conv2d) and module.groups == 1 and module.padding_mode == "zeros":
+        return module
+    return None
+
+
+def split_low_rank(lora, key_map, root):
+    """Split a converted LoRA into runtime adapters {target: (down, up, alpha_scale)} and a merge remainder.
+
+    Only plain up/down pairs on Linear and Conv2d modules run at forward time; LoCon mid weights,
+    DoRA, LoHa/LoKr and sliced targets stay in the remainder and are merged as usual.
+    """
+    adapters = {}
+    consumed = set()
+    for prefix, target in key_map.items():
+        module = _supported_module(root, target)
+        if module is None or target in adapters:
+            continue
+        for up_name, down_name in LOW_RANK_NAMES:
+            up_key, down_key = up_name.format(prefix), down_name.format(prefix)
+            if up_key in lora and down_key in lora:
+                break
+        else:
+            continue
+        if f"{prefix}.lora_mid.weight" in lora or f"{prefix}.dora_scale" in lora:
+            continue
+
+        down, up = lora[down_key], lora[up_key]
+        if isinstance(module, torch.nn.Linear):
+            down, up = down.flatten(1), up.flatten(1)
+        else:
+            if down.ndim == 2:
+                if module.kernel_size != (1, 1):
+                    continue
+                down = down[:, :, None, None]
+            up = up.reshape(up.shape[0], up.shape[1], 1, 1)
+        alpha_key = f"{prefix}.alpha"
+        scale = float(lora[alpha_key]) / down.shape[0] if alpha_key in lora else 1.0
+        adapters[target] = (down, up, scale)
+        consumed.update((up_key, down_key, alpha_key))
+
+    remainder = {k: v for k, v in lora.items() if k not in consumed}
+    return (adapters, remainder)
+
+
+def _install(patcher, root, adapters):
+    """Add object patches that wrap each target module's forward with its low-rank adapters."""
+    for target, entries in adapters.items():
+        module_path = target[:-len(".weight")]
+        module = comfy.utils.get_attr(root, module_path)
+        name = f"{module_path}.forward"
+        # Chain onto adapters installed by an earlier node, otherwise call the class forward directly
+        base_forward = patcher.object_patches.get(name, type(module).forward.__get__(module, type(module)))
+        patcher.add_object_patch(name, LowRankForward(module, base_forward, entries))
+
+
+def apply_runtime_stack(model, clip, loras):
+    """Apply [(lora_name, strength_model, strength_clip)] as forward-time adapters.
+
+    The split adapters are cached per file and architecture, so a strength change only rebuilds the
+    lightweight forward wrappers; no weight deltas are computed or merged for low-rank keys.
+    """
+    resolved = resolve_loras(loras, lora_key_map(model, clip))
+    if not resolved:
+        return (model, clip)
+
+    fingerprint = stack_fingerprint(model, clip)
+    loaded = None
+    new_model = model.clone() if model is not None else None
+    new_clip = clip.clone() if clip is not None else None
+    model_adapters = {}
+    clip_adapters = {}
+    merge_sets = []
+    for index, (lora_name, _, signature, strength_model, strength_clip) in enumerate(resolved):
+        key = ("runtime", fingerprint, signature)
+        split = STACK_CACHE.get(key)
+        if split is None:
+            try:
+                if loaded is None:
+                    # Only ever sees full parts: adapters are cached independently of strengths
+                    loaded = load_resolved([(n, p, s, 1.0, 1.0) for n, p, s, _, _ in resolved], model is not None, clip is not None)
+                lora, error = loaded[index]
+                if error is not None:
+                    raise error
+                lora = convert_lora(lora)
+                unet_adapters, clip_split = {}, {}
+                remainder = lora
+                if model is not None:
+                    unet_adapters, remainder = split_low_rank(remainder, lora_key_map(model, None), model.model)
+                if clip is not None:
+                    clip_split, remainder = split_low_rank(remainder, lora_key_map(None, clip), clip.cond_stage_model)
+                split = (unet_adapters, clip_split, comfy.lora.load_lora(remainder, lora_key_map(model, clip)))
+                STACK_CACHE.put(key, split, signature[2])
+            except Exception as e:
+                print(f"Warning: Failed to load LoRA '{lora_name}': {str(e)}. Skipping this LoRA.")
+                continue
+
+        unet_adapters, clip_split, remainder_patches = split
+        if strength_model != 0:
+            for target, (down, up, scale) in unet_adapters.items():
+                model_adapters.setdefault(target, []).append((down, up, scale * strength_model))
+        if strength_clip != 0:
+            for target, (down, up, scale) in clip_split.items():
+                clip_adapters.setdefault(target, []).append((down, up, scale * strength_clip))
+        if remainder_patches:
+            merge_sets.append((remainder_patches, strength_model, strength_clip))
+
+    add_patch_sets(new_model, new_clip, merge_sets)
+    if new_model is not None:
+        _install(new_model, new_model.model, model_adapters)
+    if new_clip is not None:
+        _install(new_clip.patcher, new_clip.cond_stage_model, clip_adapters)
+    return (new_model, new_clip)
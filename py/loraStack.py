@@ -0,0 +1,228 @@
+import re
+import json
+import hashlib
+import weakref
+import folder_paths
+import comfy.lora
+from .cacheUtils import PrepackLRUCache, env_megabytes, file_signature
+from .loraCache import load_lora_files, lora_part
+from .loraIndex import check_loras
+
+"""Prepack LoRA stack: compute LoRA patch sets once and apply a whole stack to a single model/CLIP clone."""
+
+
+STACK_CACHE = PrepackLRUCache("lora_stacks", env_megabytes("PREPACK_LORA_STACK_CACHE_MB", 1024))
+KEY_MAP_CACHE = PrepackLRUCache("lora_key_maps", env_megabytes("PREPACK_LORA_KEY_MAP_CACHE_MB", 64))
+
+# <lora:name:strength> tags, as emitted by the PrepackLoras lora_path output
+LORA_TAG_RE = re.compile(r"<lora:([^>]+)>")
+
+# Architecture fingerprints memoized per torch module (clones share the same module)
+_FINGERPRINTS = weakref.WeakKeyDictionary()
+
+
+def module_fingerprint(module):
+    """Hash of a module's state dict key names; identical architectures share LoRA key mappings."""
+    if module is None:
+        return None
+    fingerprint = _FINGERPRINTS.get(module)
+    if fingerprint is None:
+        digest = hashlib.sha1(type(module).__name__.encode("utf-8"))
+        for key in sorted(module.state_dict().keys()):
+            digest.update(key.encode("utf-8"))
+        fingerprint = digest.hexdigest()
+        _FINGERPRINTS[module] = fingerprint
+    return fingerprint
+
+
+def stack_fingerprint(model, clip):
+    return (
+        module_fingerprint(model.model) if model is not None else None,
+        module_fingerprint(clip.cond_stage_model) if clip is not None else None,
+    )
+
+
+def lora_key_map(model, clip):
+    """LoRA-key to model-key mapping, cached per architecture fingerprint (it never changes for a base model)."""
+    fingerprint = stack_fingerprint(model, clip)
+    key_map = KEY_MAP_CACHE.get(fingerprint)
+    if key_map is None:
+        key_map = {}
+        if model is not None:
+            key_map = comfy.lora.model_lora_keys_unet(model.model, key_map)
+        if clip is not None:
+            key_map = comfy.lora.model_lora_keys_clip(clip.cond_stage_model, key_map)
+        KEY_MAP_CACHE.put(fingerprint, key_map, sum(len(str(k)) + len(str(v)) for k, v in key_map.items()))
+    return key_map
+
+
+def key_map_id(model, clip):
+    """Opaque id of a model/CLIP architecture, handed to the UI so it can ask which LoRAs fit it."""
+    return ":".join(part or "" for part in stack_fingerprint(model, clip))
+
+
+def key_map_for_id(map_id):
+    """Return the cached key map for a key_map_id, or None when it is unknown or was evicted."""
+    parts = str(map_id).split(":")
+    if len(parts) != 2:
+        return None
+    return KEY_MAP_CACHE.get(tuple(part or None for part in parts))
+
+
+def convert_lora(lora):
+    """Normalize LoRA key formats, as comfy.sd.load_lora_for_models does before mapping keys."""
+    try:
+        import comfy.lora_convert
+        return comfy.lora_convert.convert_lora(lora)
+    except ImportError:
+        return lora
+
+
+def lora_patches(lora, key_map):
+    """Convert a LoRA state dict into comfy patches."""
+    return comfy.lora.load_lora(convert_lora(lora), key_map)
+
+
+def apply_patch_sets(model, clip, patch_sets):
+    """Clone model and CLIP once and add every (patches, strength_model, strength_clip) set in order."""
+    new_model = model.clone() if model is not None else None
+    new_clip = clip.clone() if clip is not None else None
+    add_patch_sets(new_model, new_clip, patch_sets)
+    return (new_model, new_clip)
+
+
+def add_patch_sets(new_model, new_clip, patch_sets):
+    """Add (patches, strength_model, strength_clip) sets to already cloned model/CLIP objects."""
+    for patches, strength_model, strength_clip in patch_sets:
+        loaded_keys = set()
+        if new_model is not None:
+            loaded_keys.update(new_model.add_patches(patches, strength_model))
+        if new_clip is not None:
+            loaded_keys.update(new_clip.add_patches(patches, strength_clip))
+        for key in patches:
+            if key not in loaded_keys:
+                print(f"Warning: LoRA key not loaded: {key}")
+
+
+def parse_lora_stack(spec):
+    """Parse a variable-length LoRA stack into [(lora_name, strength_model, strength_clip)].
+
+    Accepts a JSON list of objects ({"name", "strength_model", "strength_clip"}) or
+    [name, strength_model, strength_clip] lists, "<lora:name:strength>" tags as produced by the
+    lora_path output, or one "name[:strength_model[:strength_clip]]" entry per line.
+    """
+    spec = (spec or "").strip()
+    if not spec:
+        return []
+
+    loras = []
+    if spec.startswith("["):
+        for item in json.loads(spec):
+            if isinstance(item, dict):
+                name = item.get("name", item.get("lora_name"))
+                strength_model = float(item.get("strength_model", item.get("strength", 1.0)))
+                strength_clip = float(item.get("strength_clip", strength_model))
+            else:
+                name = item[0]
+                strength_model = float(item[1]) if len(item) > 1 else 1.0
+                strength_clip = float(item[2]) if len(item) > 2 else strength_model
+            loras.append((str(name), strength_model, strength_clip))
+        return loras
+
+    tags = LORA_TAG_RE.findall(spec)
+    entries = tags if tags else [line.strip() for line in spec.splitlines()]
+    for entry in entries:
+        if not entry or entry.startswith("#"):
+            continue
+        parts = entry.split(":")
+        strengths = []
+        # Strengths are trailing numeric fields; everything before them is the file name
+        while len(parts) > 1 and len(strengths) < 2 and _is_float(parts[-1]):
+            strengths.insert(0, float(parts.pop()))
+        name = ":".join(parts).strip()
+        strength_model = strengths[0] if strengths else 1.0
+        strength_clip = strengths[1] if len(strengths) > 1 else strength_model
+        loras.append((name, strength_model, strength_clip))
+    return loras
+
+
+def _is_float(value):
+    try:
+        float(value)
+        return True
+    except ValueError:
+        return False
+
+
+def resolve_loras(loras, key_map=None):
+    """Resolve [(lora_name, strength_model, strength_clip)] to file paths and signatures.
+
+    With a key_map, LoRAs whose indexed header matches none of its layers are reported (and skipped
+    when PREPACK_LORA_COMPAT=skip) before any tensor is read.
+    """
+    resolved = []
+    for lora_name, strength_model, strength_clip in loras:
+        try:
+            lora_path = folder_paths.get_full_path_or_raise("loras", lora_name)
+            resolved.append((lora_name, lora_path, file_signature(lora_path), strength_model, strength_clip))
+        except Exception as e:
+            print(f"Warning: Failed to load LoRA '{lora_name}': {str(e)}. Skipping this LoRA.")
+    return check_loras(resolved, key_map) if key_map is not None else resolved
+
+
+def load_resolved(resolved, has_model, has_clip):
+    """Read all resolved LoRA files up front on a thread pool; returns [(state_dict, error)] in order."""
+    # Skip tensors for a target that is absent or has zero strength (e.g. text-encoder keys without CLIP)
+    requests = []
+    for _, lora_path, _, strength_model, strength_clip in resolved:
+        part = lora_part(has_model and strength_model != 0, has_clip and strength_clip != 0)
+        requests.append((lora_path, part))
+    return load_lora_files(requests)
+
+
+def _build_patch_sets(resolved, key_map, has_model, has_clip):
+    """Return ([(patches, strength_model, strength_clip)], complete) for resolved LoRAs."""
+    loaded = load_resolved(resolved, has_model, has_clip)
+    patch_sets = []
+    complete = True
+    for (lora_name, _, _, strength_model, strength_clip), (lora, error) in zip(resolved, loaded):
+        try:
+            if error is not None:
+                raise error
+            patch_sets.append((lora_patches(lora, key_map), strength_model, strength_clip))
+        except Exception as e:
+            complete = False
+            print(f"Warning: Failed to load LoRA '{lora_name}': {str(e)}. Skipping this LoRA.")
+    return (patch_sets, complete)
+
+
+def apply_lora_stack(model, clip, loras):
+    """Apply [(lora_name, strength_model, strength_clip)] in one pass: resolve every file, map keys once, clone once."""
+    key_map = lora_key_map(model, clip)
+    resolved = resolve_loras(loras, key_map)
+    if not resolved:
+        return (model, clip)
+    patch_sets, _ = _build_patch_sets(resolved, key_map, model is not None, clip is not None)
+    return apply_patch_sets(model, clip, patch_sets)
+
+
+def apply_fused_stack(model, clip, loras):
+    """Apply [(lora_name, strength_model, strength_clip)] as one cached, precomputed patch set.
+
+    The patch sets are cached by the target architecture and the (file, strength_model, strength_clip)
+    list, so repeat runs with the same stack skip key mapping and LoRA conversion entirely.
+    """
+    key_map = lora_key_map(model, clip)
+    resolved = resolve_loras(loras, key_map)
+    if not resolved:
+        return (model, clip)
+
+    key = (stack_fingerprint(model, clip), tuple((sig, sm, sc) for _, _, sig, sm, sc in resolved))
+    patch_sets = STACK_CACHE.get(key)
+    if patch_sets is None:
+        patch_sets, complete = _build_patch_sets(resolved, key_map, model is not None, clip is not None)
+        # Patches alias the cached LoRA tensors; file sizes bound what they keep alive
+        if complete:
+            STACK_CACHE.put(key, patch_sets, sum(sig[2] for _, _, sig, _, _ in resolved))
+
+    return apply_patch_sets(model, clip, patch_sets)
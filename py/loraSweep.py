@@ -0,0 +1,79 @@
+import folder_paths
+from .fileIndex import get_filename_list
+from .loraCache import load_lora_file, lora_part
+from .loraIndex import check_loras
+from .loraStack import lora_key_map, lora_patches, apply_patch_sets
+
+"""Prepack_Lora_Sweep: build one patched model/CLIP variant per LoRA strength from a single load."""
+
+
+class PrepackLoraSweep:
+    @classmethod
+    def INPUT_TYPES(s):
+        return {
+            "required": {
+                "model": ("MODEL", {"tooltip": "The diffusion model to apply the LoRA to."}),
+                "clip": ("CLIP", {"tooltip": "The CLIP encoder to apply the LoRA to."}),
+                "lora_name": (get_filename_list("loras"), {
+                    "tooltip": "The LoRA file to sweep."
+                }),
+                "strengths": ("STRING", {
+                    "default": "0.2, 0.4, 0.6, 0.8, 1.0, 1.2",
+                    "multiline": False,
+                    "tooltip": "Comma-separated model strengths; one variant is produced per value."
+                }),
+                "strength_clip": ("FLOAT", {
+                    "default": 1.0,
+                    "min": -100.0,
+                    "max": 100.0,
+                    "step": 0.01,
+                    "tooltip": "Strength for the CLIP encoder, used for every variant unless sweep_clip is enabled."
+                }),
+                "sweep_clip": ("BOOLEAN", {
+                    "default": False,
+                    "tooltip": "Apply each swept strength to the CLIP encoder as well."
+                }),
+            }
+        }
+
+    RETURN_TYPES = ("MODEL", "CLIP", "STRING")
+    RETURN_NAMES = ("model", "clip", "lora_path")
+    OUTPUT_IS_LIST = (True, True, True)
+    OUTPUT_TOOLTIPS = (
+        "One patched diffusion model per strength; all variants share the unpatched base weights.",
+        "One patched CLIP per strength.",
+        "LoRA tag with strength for each variant, e.g. <lora:name:0.60>."
+    )
+    FUNCTION = "sweep"
+
+    CATEGORY = "💀Prepack"
+    DESCRIPTION = "Load a LoRA once and emit model/CLIP variants for a list of strengths; variants share base weights and patch data, so memory grows with the number of deltas rather than full models."
+
+    def sweep(self, model, clip, lora_name, strengths, strength_clip, sweep_clip):
+        try:
+            values = [float(v) for v in strengths.replace(";", ",").split(",") if v.strip()]
+        except ValueError as e:
+            raise ValueError(f"Invalid strengths '{strengths}': {str(e)}")
+        if not values:
+            raise ValueError("At least one strength is required")
+
+        # Load, map and convert once; every variant reuses the same patch dict
+        lora_path = folder_paths.get_full_path_or_raise("loras", lora_name)
+        key_map = lora_key_map(model, clip)
+        labels = [f"<lora:{lora_name}:{strength:.2f}>" for strength in values]
+        if not check_loras([(lora_name, lora_path)], key_map):
+            return ([model] * len(values), [clip] * len(values), labels)
+
+        clip_used = sweep_clip or strength_clip != 0
+        lora = load_lora_file(lora_path, lora_part(True, clip_used))
+        patches = lora_patches(lora, key_map)
+
+        models = []
+        clips = []
+        for strength in values:
+            variant_clip_strength = strength if sweep_clip else float(strength_clip)
+            new_model, new_clip = apply_patch_sets(model, clip, [(patches, strength, variant_clip_strength)])
+            models.append(new_model)
+            clips.append(new_clip)
+
+        return (models, clips, labels)
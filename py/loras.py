@@ -1,14 +1,118 @@
-import folder_paths
-import comfy.sd
-import comfy.utils
 import os
-import glob
+import asyncio
+import hashlib
+from email.utils import formatdate
 from server import PromptServer
 from aiohttp import web
+from .cacheUtils import PrepackLRUCache, env_megabytes, run_blocking
+from .fileIndex import get_filename_list, get_full_path, get_indexed_files
+from .loraCache import prefetch_lora_file
+from .loraStack import apply_fused_stack, apply_lora_stack, parse_lora_stack, key_map_id, key_map_for_id
+from .loraIndex import compatible_lora_names
+from .loraRuntime import apply_runtime_stack
 
 """Prepack_Loras: load and apply up to 3 LoRA adapters to model and CLIP."""
 
 
+# Sidecar text documents live in a folder named after the LoRA file: <loras>/<lora_base>/*.txt
+TEXT_CACHE = PrepackLRUCache("lora_texts", env_megabytes("PREPACK_LORA_TEXT_CACHE_MB", 32))
+
+# Concurrent filesystem jobs allowed per route; further requests wait without blocking the event loop
+ROUTE_CONCURRENCY = max(1, int(os.environ.get("PREPACK_ROUTE_CONCURRENCY", "2")))
+_LIST_LIMIT = asyncio.Semaphore(ROUTE_CONCURRENCY)
+_CONTENT_LIMIT = asyncio.Semaphore(ROUTE_CONCURRENCY)
+_BULK_LIMIT = asyncio.Semaphore(ROUTE_CONCURRENCY)
+_PREFETCH_LIMIT = asyncio.Semaphore(ROUTE_CONCURRENCY)
+# Combo filtering walks the whole LoRA list; one request at a time is enough since the index is shared
+_COMPAT_LIMIT = asyncio.Semaphore(1)
+
+
+def lora_text_folder(lora_name):
+    """Return the sidecar text folder for a LoRA, or None when the LoRA is unknown."""
+    lora_path = get_full_path("loras", lora_name)
+    if not lora_path:
+        return None
+    lora_dir = os.path.dirname(lora_path)
+    lora_base = os.path.splitext(os.path.basename(lora_path))[0]
+    return os.path.join(lora_dir, lora_base)
+
+
+def list_lora_texts(lora_name):
+    """Return (text file names, folder mtime_ns); listings are re-read only when the folder mtime changes."""
+    text_folder = lora_text_folder(lora_name)
+    if text_folder is None:
+        return ([], 0)
+    try:
+        mtime_ns = os.stat(text_folder).st_mtime_ns
+    except OSError:
+        return ([], 0)
+
+    key = ("list", text_folder, mtime_ns)
+    text_files = TEXT_CACHE.get(key)
+    if text_files is None:
+        TEXT_CACHE.discard_where(lambda k: k[0] == "list" and k[1] == text_folder)
+        with os.scandir(text_folder) as entries:
+            # Same selection as glob("*.txt"): hidden files are skipped
+            text_files = sorted(
+                entry.name for entry in entries
+                if entry.name.endswith(".txt") and not entry.name.startswith(".") and entry.is_file()
+            )
+        TEXT_CACHE.put(key, text_files, sum(len(name) for name in text_files))
+    return (text_files, mtime_ns)
+
+
+def read_lora_text(lora_name, text_name):
+    """Return (content, mtime_ns, size) of a sidecar text file; content is None when it does not exist."""
+    text_folder = lora_text_folder(lora_name)
+    if text_folder is None:
+        return (None, 0, 0)
+    text_file_path = os.path.join(text_folder, text_name)
+    try:
+        stat = os.stat(text_file_path)
+    except OSError:
+        return (None, 0, 0)
+    if not os.path.isfile(text_file_path):
+        return (None, 0, 0)
+
+    key = ("text", text_file_path, stat.st_mtime_ns, stat.st_size)
+    content = TEXT_CACHE.get(key)
+    if content is None:
+        TEXT_CACHE.discard_where(lambda k: k[0] == "text" and k[1] == text_file_path)
+        with open(text_file_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        TEXT_CACHE.put(key, content, len(content))
+    return (content, stat.st_mtime_ns, stat.st_size)
+
+
+def _is_valid_text_name(text_name):
+    # Documents are plain file names inside the sidecar folder; reject any path component
+    return bool(text_name) and os.path.basename(text_name) == text_name and text_name not in (".", "..")
+
+
+def _cache_headers(etag, mtime_ns):
+    return {
+        "ETag": etag,
+        "Last-Modified": formatdate(mtime_ns / 1e9, usegmt=True),
+        "Cache-Control": "no-cache",
+    }
+
+
+def _etag_matches(if_none_match, etag):
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def _not_modified(request, etag, mtime_ns):
+    """Evaluate If-None-Match / If-Modified-Since against the current validators."""
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+    if_modified_since = request.if_modified_since
+    if if_modified_since is not None:
+        return int(mtime_ns // 1_000_000_000) <= int(if_modified_since.timestamp())
+    return False
+
+
 # HTTP API routes for LoRA text document functionality
 @PromptServer.instance.routes.get("/prepack/lora-texts/{lora_name}")
 async def get_lora_texts(request):
@@ -16,27 +120,16 @@ async def get_lora_texts(request):
     lora_name = request.match_info["lora_name"]
     
     try:
-        # Get full path of the LoRA file
-        lora_path = folder_paths.get_full_path("loras", lora_name)
-        if not lora_path:
-            return web.json_response([])
-        
-        # Get the directory and base name without extension
-        lora_dir = os.path.dirname(lora_path)
-        lora_base = os.path.splitext(os.path.basename(lora_path))[0]
-        
-        # Look for folder with same name as LoRA file
-        text_folder = os.path.join(lora_dir, lora_base)
-        text_files = []
-        
-        if os.path.isdir(text_folder):
-            # Find all .txt files in the folder
-            txt_pattern = os.path.join(text_folder, "*.txt")
-            for txt_file in sorted(glob.glob(txt_pattern)):
-                txt_name = os.path.basename(txt_file)
-                text_files.append(txt_name)
-        
-        return web.json_response(text_files)
+        text_files, mtime_ns = await run_blocking(list_lora_texts, lora_name, limit=_LIST_LIMIT)
+        if not mtime_ns:
+            return web.json_response(text_files)
+
+        digest = hashlib.sha1("\n".join(text_files).encode("utf-8")).hexdigest()[:16]
+        etag = f'"{mtime_ns:x}-{digest}"'
+        headers = _cache_headers(etag, mtime_ns)
+        if _not_modified(request, etag, mtime_ns):
+            return web.Response(status=304, headers=headers)
+        return web.json_response(text_files, headers=headers)
     
     except Exception as e:
         print(f"Error getting LoRA texts for {lora_name}: {str(e)}")
@@ -50,42 +143,136 @@ async def get_lora_text_content(request):
     text_name = request.match_info["text_name"]
     
     try:
-        # Get full path of the LoRA file
-        lora_path = folder_paths.get_full_path("loras", lora_name)
-        if not lora_path:
-            return web.Response(text="", content_type="text/plain")
-        
-        # Get the directory and base name without extension
-        lora_dir = os.path.dirname(lora_path)
-        lora_base = os.path.splitext(os.path.basename(lora_path))[0]
-        
-        # Construct path to text file
-        text_file_path = os.path.join(lora_dir, lora_base, text_name)
-        
-        # Security check: ensure the file is within the expected directory
-        if not os.path.commonpath([os.path.dirname(text_file_path), lora_dir]) == lora_dir:
+        # Security check: only plain file names inside the LoRA's text folder are served
+        if not _is_valid_text_name(text_name):
             return web.Response(text="Access denied", status=403)
-        
-        # Read and return file content
-        if os.path.isfile(text_file_path):
-            with open(text_file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            return web.Response(text=content, content_type="text/plain")
-        else:
+
+        content, mtime_ns, size = await run_blocking(read_lora_text, lora_name, text_name, limit=_CONTENT_LIMIT)
+        if content is None:
             return web.Response(text="", content_type="text/plain")
+
+        etag = f'"{mtime_ns:x}-{size:x}"'
+        headers = _cache_headers(etag, mtime_ns)
+        if _not_modified(request, etag, mtime_ns):
+            return web.Response(status=304, headers=headers)
+        return web.Response(text=content, content_type="text/plain", headers=headers)
     
     except Exception as e:
         print(f"Error getting LoRA text content for {lora_name}/{text_name}: {str(e)}")
         return web.Response(text="", content_type="text/plain")
 
 
-class PrepackLoras:
-    def __init__(self):
-        self.loaded_lora = None
+# Upper bound on LoRAs per bulk request
+MAX_BULK_LORAS = 256
 
+
+def _read_bulk_texts(entries):
+    """Collect ({lora_name: {"texts": [...], "contents": {text_name: content}}}, validators) for bulk request entries.
+
+    validators lists the folder mtime and every returned file's mtime and size, in request order, so one
+    combined ETag changes whenever any part of the response does.
+    """
+    result = {}
+    validators = []
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {"lora_name": entry}
+        if not isinstance(entry, dict):
+            continue
+        lora_name = entry.get("lora_name")
+        if not isinstance(lora_name, str) or not lora_name:
+            continue
+
+        item = result.setdefault(lora_name, {"texts": [], "contents": {}})
+        try:
+            item["texts"], mtime_ns = list_lora_texts(lora_name)
+            validators.append((lora_name, mtime_ns))
+            for text_name in entry.get("text_names") or []:
+                if not isinstance(text_name, str) or text_name in item["contents"]:
+                    continue
+                if not _is_valid_text_name(text_name):
+                    continue
+                content, mtime_ns, size = read_lora_text(lora_name, text_name)
+                item["contents"][text_name] = content if content is not None else ""
+                validators.append((lora_name, text_name, mtime_ns, size))
+        except Exception as e:
+            print(f"Error getting LoRA texts for {lora_name}: {str(e)}")
+            validators.append((lora_name, "error"))
+    return (result, validators)
+
+
+@PromptServer.instance.routes.post("/prepack/lora-texts-bulk")
+async def get_lora_texts_bulk(request):
+    """Get text document listings (and optionally contents) for many LoRAs in one request; honours If-None-Match"""
+    try:
+        body = await request.json()
+        entries = body.get("loras", [])
+        if not isinstance(entries, list):
+            raise ValueError("'loras' must be a list")
+    except Exception as e:
+        return web.json_response({"error": f"Invalid request body: {str(e)}"}, status=400)
+
+    result, validators = await run_blocking(_read_bulk_texts, entries[:MAX_BULK_LORAS], limit=_BULK_LIMIT)
+    # Listings are part of the response too, so they feed the validator alongside the mtimes
+    digest = hashlib.sha1(repr((validators, [item["texts"] for item in result.values()])).encode("utf-8")).hexdigest()[:16]
+    etag = f'"bulk-{digest}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    # The bulk response has no single mtime, so only If-None-Match applies
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match is not None and _etag_matches(if_none_match, etag):
+        return web.Response(status=304, headers=headers)
+    return web.json_response(result, headers=headers)
+
+
+def _start_prefetch(slot, lora_name):
+    lora_path = get_full_path("loras", lora_name) if lora_name and lora_name != "None" else None
+    if lora_name and lora_name != "None" and not lora_path:
+        prefetch_lora_file(slot, None)
+        return "unknown"
+    return prefetch_lora_file(slot, lora_path)
+
+
+@PromptServer.instance.routes.post("/prepack/lora-prefetch")
+async def prefetch_lora(request):
+    """Start loading a selected LoRA into the shared cache so the next execution finds it in memory"""
+    try:
+        body = await request.json()
+        lora_name = body.get("lora_name")
+        slot = str(body.get("slot", lora_name))
+    except Exception as e:
+        return web.json_response({"error": f"Invalid request body: {str(e)}"}, status=400)
+
+    try:
+        status = await run_blocking(_start_prefetch, slot, lora_name, limit=_PREFETCH_LIMIT)
+    except Exception as e:
+        print(f"Error prefetching LoRA {lora_name}: {str(e)}")
+        status = "error"
+    return web.json_response({"lora_name": lora_name, "status": status})
+
+
+def _compatible_loras(map_id):
+    key_map = key_map_for_id(map_id)
+    if key_map is None:
+        return {"filtered": False, "loras": get_filename_list("loras"), "pending": 0}
+    lora_names, pending = compatible_lora_names(get_indexed_files("loras"), key_map)
+    return {"filtered": True, "loras": lora_names, "pending": pending}
+
+
+@PromptServer.instance.routes.get("/prepack/lora-compat")
+async def get_compatible_loras(request):
+    """List LoRAs whose indexed header matches the model last executed by a Prepack LoRA node; "pending" counts files still being indexed"""
+    map_id = request.query.get("model", "")
+    try:
+        return web.json_response(await run_blocking(_compatible_loras, map_id, limit=_COMPAT_LIMIT))
+    except Exception as e:
+        print(f"Error filtering LoRAs by model: {str(e)}")
+        return web.json_response({"filtered": False, "loras": [], "pending": 0})
+
+
+class PrepackLoras:
     @classmethod
     def INPUT_TYPES(s):
-        lora_list = ["None"] + folder_paths.get_filename_list("loras")
+        lora_list = ["None"] + get_filename_list("loras")
         return {
             "required": {
                 "model": ("MODEL", {"tooltip": "The diffusion model to apply LoRA adapters to."}),
@@ -157,6 +344,15 @@ class PrepackLoras:
                     "default": "None",
                     "tooltip": "Select text document associated with the third LoRA (automatically populated)."
                 }),
+                "lora_stack": ("STRING", {
+                    "default": "",
+                    "multiline": True,
+                    "tooltip": "Additional LoRAs applied after the slots: one 'name:strength_model[:strength_clip]' per line, <lora:name:strength> tags, or a JSON list."
+                }),
+                "apply_mode": (["standard", "fused", "runtime"], {
+                    "advanced": True,
+                    "tooltip": "standard: resolve the whole stack, then patch one model/CLIP clone in a single pass. fused: precompute and cache the whole stack's patches, then patch model and CLIP once. runtime: run plain up/down LoRA pairs on Linear/Conv2d layers as low-rank adapters at forward time (fast strength changes); LoCon mid weights, DoRA, LoHa/LoKr and sliced targets are still merged into the weights."
+                }),
             }
         }
 
@@ -171,7 +367,7 @@ class PrepackLoras:
     FUNCTION = "load_loras"
 
     CATEGORY = "💀Prepack"
-    DESCRIPTION = "Load and apply up to 3 LoRA adapters to both the diffusion model and the CLIP encoder; also returns a formatted LoRA prompt string."
+    DESCRIPTION = "Load and apply up to 3 LoRA adapters (plus any number from lora_stack) to both the diffusion model and the CLIP encoder; also returns a formatted LoRA prompt string."
     
     @classmethod
     def VALIDATE_INPUTS(s, **kwargs):
@@ -180,7 +376,8 @@ class PrepackLoras:
 
     def load_loras(self, model, clip, lora_name_1, lora_text_1, strength_model_1, strength_clip_1, 
                    lora_name_2="None", lora_text_2="None", strength_model_2=1.0, strength_clip_2=1.0,
-                   lora_name_3="None", lora_text_3="None", strength_model_3=1.0, strength_clip_3=1.0):
+                   lora_name_3="None", lora_text_3="None", strength_model_3=1.0, strength_clip_3=1.0,
+                   lora_stack="", apply_mode="standard"):
         
         loras_to_load = [(lora_name_1, float(strength_model_1), float(strength_clip_1))]
         if lora_name_2 != "None":
@@ -188,36 +385,19 @@ class PrepackLoras:
         if lora_name_3 != "None":
             loras_to_load.append((lora_name_3, float(strength_model_3), float(strength_clip_3)))
 
-        current_model = model
-        current_clip = clip
-        for lora_name, strength_model, strength_clip in loras_to_load:
-            # Skip when user selects "None" for a LoRA slot
-            if lora_name == "None":
-                continue
-            if strength_model == 0 and strength_clip == 0:
-                continue
-            
-            try:
-                lora_path = folder_paths.get_full_path_or_raise("loras", lora_name)
-                lora = None
-                if self.loaded_lora is not None:
-                    if self.loaded_lora[0] == lora_path:
-                        lora = self.loaded_lora[1]
-                    else:
-                        self.loaded_lora = None
-
-                if lora is None:
-                    lora = comfy.utils.load_torch_file(lora_path, safe_load=True)
-                    self.loaded_lora = (lora_path, lora)
-
-                model_lora, clip_lora = comfy.sd.load_lora_for_models(
-                    current_model, current_clip, lora, strength_model, strength_clip
-                )
-                current_model = model_lora
-                current_clip = clip_lora
-            except Exception as e:
-                print(f"Warning: Failed to load LoRA '{lora_name}': {str(e)}. Skipping this LoRA.")
-                continue
+        try:
+            loras_to_load.extend(parse_lora_stack(lora_stack))
+        except Exception as e:
+            print(f"Warning: Failed to parse lora_stack: {str(e)}. Ignoring the stack input.")
+
+        # Skip "None" slots and LoRAs with both strengths at 0, then patch the whole stack in one pass
+        active = [entry for entry in loras_to_load if entry[0] != "None" and (entry[1] != 0 or entry[2] != 0)]
+        if apply_mode == "fused":
+            current_model, current_clip = apply_fused_stack(model, clip, active)
+        elif apply_mode == "runtime":
+            current_model, current_clip = apply_runtime_stack(model, clip, active)
+        else:
+            current_model, current_clip = apply_lora_stack(model, clip, active)
 
         # Generate lora_path output (LoRA file paths with strengths)
         lora_path_parts = []
@@ -238,23 +418,22 @@ class PrepackLoras:
         for lora_name, text_name in lora_text_pairs:
             if lora_name != "None" and text_name != "None":
                 try:
-                    lora_path = folder_paths.get_full_path("loras", lora_name)
-                    if lora_path:
-                        lora_dir = os.path.dirname(lora_path)
-                        lora_base = os.path.splitext(os.path.basename(lora_path))[0]
-                        text_file_path = os.path.join(lora_dir, lora_base, text_name)
-                        
-                        if os.path.isfile(text_file_path):
-                            with open(text_file_path, 'r', encoding='utf-8') as f:
-                                content = f.read().strip()
-                                if content:  # Only add non-empty content
-                                    lora_text_contents.append(content)
+                    if not _is_valid_text_name(text_name):
+                        continue
+                    content, _, _ = read_lora_text(lora_name, text_name)
+                    content = content.strip() if content else ""
+                    if content:  # Only add non-empty content
+                        lora_text_contents.append(content)
                 except Exception as e:
                     print(f"Warning: Failed to read text file '{text_name}' for LoRA '{lora_name}': {str(e)}")
                     continue
         
         lora_text_output = ", ".join(lora_text_contents)
         
-        return (current_model, current_clip, lora_path_output, lora_text_output)
+        # The model id lets the frontend narrow the LoRA combos to files that fit this model
+        return {
+            "ui": {"prepack_model": [key_map_id(model, clip)]},
+            "result": (current_model, current_clip, lora_path_output, lora_text_output),
+        }
 
 
@@ -1,18 +1,84 @@
-import folder_paths
-import comfy.sd
-import comfy.utils
-import comfy.model_management
+import copy
+import comfy.model_sampling
+from .cacheUtils import file_signature
+from .fileIndex import get_filename_list, get_full_path
+from .loraStack import apply_lora_stack, parse_lora_stack
 
 """Prepack_Loras_and_MSSD3: load and apply up to 3 LoRA adapters to model, and apply SD3 model sampling."""
 
 
+if hasattr(comfy.model_sampling, "ModelSamplingDiscreteFlow") and hasattr(comfy.model_sampling, "CONST"):
+    class ModelSamplingAdvanced(comfy.model_sampling.ModelSamplingDiscreteFlow, comfy.model_sampling.CONST):
+        pass
+else:
+    ModelSamplingAdvanced = None
+
+
+def _discrete_flow_sampling(model, shift):
+    # Same construction as ComfyUI's ModelSamplingSD3 node
+    model_sampling = ModelSamplingAdvanced(model.model.model_config)
+    model_sampling.set_parameters(shift=shift, multiplier=1000)
+    return model_sampling
+
+
+def _sd3_class_sampling(model, shift):
+    return comfy.model_sampling.ModelSamplingSD3(shift=shift)
+
+
+def _shifted_copy_sampling(model, shift):
+    # Copy instead of mutating: clones share model.model, so the original sampling object must stay intact
+    model_sampling = copy.copy(model.model.model_sampling)
+    model_sampling.shift = shift
+    return model_sampling
+
+
+# SD3 sampling strategies in order of preference; (name, available, build(model, shift) -> model_sampling)
+SD3_SAMPLING_STRATEGIES = (
+    ("discrete_flow", ModelSamplingAdvanced is not None, _discrete_flow_sampling),
+    ("sd3_class", hasattr(comfy.model_sampling, "ModelSamplingSD3"), _sd3_class_sampling),
+    ("shift_attribute", True, _shifted_copy_sampling),
+)
+
+# Resolved once at import; the ComfyUI version cannot change while the server runs
+SD3_SAMPLING = next((name, build) for name, available, build in SD3_SAMPLING_STRATEGIES if available)
+
+
+def apply_sd3_sampling(model, shift):
+    """Return a clone of model with SD3 sampling for shift, installed as an object patch."""
+    name, build = SD3_SAMPLING
+    try:
+        model_sampling = build(model, float(shift))
+    except Exception as e:
+        print(f"Info: SD3 sampling ({name}) could not be applied: {e}. Shift parameter ({shift}) ignored. Model returned unchanged.")
+        return model
+    m = model.clone()
+    m.add_object_patch("model_sampling", model_sampling)
+    return m
+
+
+def _stack_key(active):
+    """Identity of a LoRA stack including file versions, or None when a file cannot be resolved."""
+    key = []
+    for lora_name, strength_model, strength_clip in active:
+        lora_path = get_full_path("loras", lora_name)
+        if not lora_path:
+            return None
+        try:
+            key.append((lora_name, file_signature(lora_path), strength_model, strength_clip))
+        except OSError:
+            return None
+    return tuple(key)
+
+
 class PrepackLorasAndMSSD3:
     def __init__(self):
-        self.loaded_lora = None
+        # (input model, stack key, LoRA-patched model) and (LoRA-patched model, shift, sampled model)
+        self.lora_stage = None
+        self.sampling_stage = None
 
     @classmethod
     def INPUT_TYPES(s):
-        lora_list = ["None"] + folder_paths.get_filename_list("loras")
+        lora_list = ["None"] + get_filename_list("loras")
         return {
             "required": {
                 "model": ("MODEL", {"tooltip": "The diffusion model to apply LoRA adapters and SD3 sampling to."}),
@@ -50,6 +116,11 @@ class PrepackLorasAndMSSD3:
                     "step": 0.01,
                     "tooltip": "Strength for the diffusion model. Typical range [-2.0, 2.0]; 0 disables."
                 }),
+                "lora_stack": ("STRING", {
+                    "default": "",
+                    "multiline": True,
+                    "tooltip": "Additional LoRAs applied after the slots: one 'name:strength_model' per line, <lora:name:strength> tags, or a JSON list."
+                }),
                 "shift": ("FLOAT", {
                     "default": 3.0,
                     "min": 0.0,
@@ -73,7 +144,7 @@ class PrepackLorasAndMSSD3:
     def load_loras_and_apply_mssd3(self, model, lora_name_1, strength_model_1,
                                    lora_name_2="None", strength_model_2=0.0,
                                    lora_name_3="None", strength_model_3=0.0,
-                                   shift=3.0):
+                                   lora_stack="", shift=3.0):
         
         # First apply LoRAs (no CLIP processing)
         loras_to_load = [(lora_name_1, float(strength_model_1))]
@@ -82,112 +153,27 @@ class PrepackLorasAndMSSD3:
         if lora_name_3 != "None":
             loras_to_load.append((lora_name_3, float(strength_model_3)))
 
-        current_model = model
-        for lora_name, strength_model in loras_to_load:
-            # Skip when user selects "None" for a LoRA slot
-            if lora_name == "None":
-                continue
-            if strength_model == 0:
-                continue
-            
-            try:
-                lora_path = folder_paths.get_full_path_or_raise("loras", lora_name)
-                lora = None
-                if self.loaded_lora is not None:
-                    if self.loaded_lora[0] == lora_path:
-                        lora = self.loaded_lora[1]
-                    else:
-                        self.loaded_lora = None
-
-                if lora is None:
-                    lora = comfy.utils.load_torch_file(lora_path, safe_load=True)
-                    self.loaded_lora = (lora_path, lora)
-            except Exception as e:
-                print(f"Warning: Failed to load LoRA file '{lora_name}': {str(e)}. Skipping this LoRA.")
-                continue
-
-            try:
-                # Apply LoRA only to model, not CLIP
-                model_lora, _ = comfy.sd.load_lora_for_models(
-                    current_model, None, lora, strength_model, 0
-                )
-                current_model = model_lora
-            except Exception as e:
-                print(f"Warning: Failed to apply LoRA '{lora_name}': {str(e)}. Skipping this LoRA.")
-                continue
-
-        # Apply SD3 model sampling
-        current_model = self.apply_sd3_sampling(current_model, shift)
-
-        return (current_model,)
-
-    def apply_sd3_sampling(self, model, shift):
-        """Apply SD3 model sampling configuration - safe detection of API availability."""
         try:
-            # First check if SD3 sampling classes are available
-            sd3_sampling_class = None
-            
-            # Try to find SD3 sampling class in various possible locations
-            try:
-                # Option 1: Direct import from ComfyUI's sampling module
-                import comfy.model_sampling
-                if hasattr(comfy.model_sampling, 'ModelSamplingSD3'):
-                    sd3_sampling_class = comfy.model_sampling.ModelSamplingSD3
-            except (ImportError, AttributeError):
-                pass
-            
-            # Option 2: Try alternative locations
-            if sd3_sampling_class is None:
-                try:
-                    # Check if available in model_management or other modules
-                    if hasattr(comfy.model_management, 'ModelSamplingSD3'):
-                        sd3_sampling_class = comfy.model_management.ModelSamplingSD3
-                except AttributeError:
-                    pass
-            
-            # Option 3: Check in the model itself for existing sampling config
-            if sd3_sampling_class is None and hasattr(model.model, 'model_sampling'):
-                current_sampling = model.model.model_sampling
-                # If already has shift attribute, just modify it
-                if hasattr(current_sampling, 'shift'):
-                    try:
-                        m = model.clone()
-                        m.model.model_sampling.shift = float(shift)
-                        return m
-                    except Exception:
-                        pass
-            
-            # If we found a proper SD3 sampling class, use it
-            if sd3_sampling_class is not None:
-                try:
-                    m = model.clone()
-                    # Create new SD3 sampling instance with shift parameter
-                    sd3_sampling = sd3_sampling_class(shift=float(shift))
-                    m.model.model_sampling = sd3_sampling
-                    return m
-                except Exception as create_error:
-                    print(f"Info: Could not create SD3 sampling instance: {create_error}")
-            
-            # Fallback: No proper SD3 API found, but apply basic shift if possible
-            if hasattr(model.model, 'model_sampling'):
-                try:
-                    m = model.clone()
-                    # Try to set shift in any way possible
-                    if not hasattr(m.model.model_sampling, 'shift'):
-                        setattr(m.model.model_sampling, 'shift', float(shift))
-                    else:
-                        m.model.model_sampling.shift = float(shift)
-                    return m
-                except Exception:
-                    pass
-            
-            # Ultimate fallback: return original model with info message
-            print(f"Info: SD3 sampling API not detected. Shift parameter ({shift}) ignored. Model returned unchanged.")
-            return model
-            
+            loras_to_load.extend((name, strength_model) for name, strength_model, _ in parse_lora_stack(lora_stack))
         except Exception as e:
-            # Fallback: return original model if any unexpected error occurs
-            print(f"Warning: Unexpected error in SD3 sampling configuration: {e}. Model returned unchanged.")
-            return model
+            print(f"Warning: Failed to parse lora_stack: {str(e)}. Ignoring the stack input.")
+
+        # Skip "None" slots and zero strengths, then patch the whole stack in one pass (model only, no CLIP)
+        active = [(name, strength_model, 0.0) for name, strength_model in loras_to_load if name != "None" and strength_model != 0]
+
+        # Reuse the previous LoRA-patched model when the input model and the stack are unchanged
+        stack_key = _stack_key(active)
+        if self.lora_stage is not None and self.lora_stage[0] is model and stack_key is not None and self.lora_stage[1] == stack_key:
+            current_model = self.lora_stage[2]
+        else:
+            current_model, _ = apply_lora_stack(model, None, active)
+            self.lora_stage = (model, stack_key, current_model) if stack_key is not None else None
 
+        # Apply SD3 model sampling; repeat runs with the same patched model and shift skip the clone
+        shift = float(shift)
+        if self.sampling_stage is not None and self.sampling_stage[0] is current_model and self.sampling_stage[1] == shift:
+            return (self.sampling_stage[2],)
+        sampled_model = apply_sd3_sampling(current_model, shift)
+        self.sampling_stage = (current_model, shift, sampled_model)
 
+        return (sampled_model,)
@@ -0,0 +1,149 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import folder_paths
+import torch
+import comfy.sd
+import comfy.model_management
+import nodes
+from .cacheUtils import PrepackLRUCache, env_megabytes, file_signature
+from .fp8Cache import cached_fp8_path
+
+"""Prepack model cache: process-wide LRU of loaded UNet, CLIP and VAE components shared by the model loaders."""
+
+
+def _default_budget_mb():
+    # Default to half of system RAM; set PREPACK_MODEL_CACHE_MB=0 to disable caching
+    try:
+        total = comfy.model_management.get_total_memory(torch.device("cpu"))
+        return max(int(total // (2 * 1024 * 1024)), 0)
+    except Exception:
+        return 8192
+
+
+MODEL_CACHE = PrepackLRUCache("models", env_megabytes("PREPACK_MODEL_CACHE_MB", _default_budget_mb()))
+
+
+def unet_model_options(weight_dtype):
+    """Translate the weight_dtype widget value into comfy model_options."""
+    model_options = {}
+    try:
+        if weight_dtype == "fp8_e4m3fn":
+            model_options["dtype"] = torch.float8_e4m3fn
+        elif weight_dtype == "fp8_e4m3fn_fast":
+            model_options["dtype"] = torch.float8_e4m3fn
+            model_options["fp8_optimizations"] = True
+        elif weight_dtype == "fp8_e5m2":
+            model_options["dtype"] = torch.float8_e5m2
+    except AttributeError:
+        # Fallback silently if torch version doesn't support float8 types
+        pass
+    return model_options
+
+
+def clip_model_options(device):
+    """Translate the device widget value into comfy CLIP model_options."""
+    model_options = {}
+    if device == "cpu":
+        model_options["load_device"] = model_options["offload_device"] = torch.device("cpu")
+    return model_options
+
+
+def _reuse(loaded, key):
+    """Return the object memoized in a node's (key, object) slot when the key still matches."""
+    if loaded is not None and loaded[0] == key:
+        return loaded[1]
+    return None
+
+
+def unet_key(unet_path, weight_dtype):
+    return ("unet", file_signature(unet_path), weight_dtype)
+
+
+def is_resident(key, loaded=None):
+    """True when the component for key is still held by a node's slot or by the model cache."""
+    return (loaded is not None and loaded[0] == key) or key in MODEL_CACHE
+
+
+def load_unet(unet_name, weight_dtype, loaded=None):
+    """Load a diffusion model; returns a (key, model) slot that callers pass back as loaded."""
+    unet_path = folder_paths.get_full_path_or_raise("diffusion_models", unet_name)
+    key = unet_key(unet_path, weight_dtype)
+    signature = key[1]
+    model = _reuse(loaded, key)
+    if model is None:
+        model = MODEL_CACHE.get(key)
+    if model is None:
+        # Prefer a pre-cast fp8 copy when the on-disk fp8 cache is enabled
+        load_path = cached_fp8_path(unet_path, weight_dtype) or unet_path
+        model = comfy.sd.load_diffusion_model(load_path, model_options=unet_model_options(weight_dtype))
+        # Source identity shared by every clone (they share model.model); used by the latent cache key
+        model.model.prepack_source = repr(key)
+        MODEL_CACHE.put(key, model, signature[2])
+    return (key, model)
+
+
+def load_clip(clip_names, clip_type, device, loaded=None):
+    """Load one or more text encoders; returns a (key, clip) slot that callers pass back as loaded."""
+    clip_paths = [folder_paths.get_full_path_or_raise("text_encoders", name) for name in clip_names]
+    signatures = tuple(file_signature(path) for path in clip_paths)
+    key = ("clip", signatures, str(clip_type), device)
+    clip = _reuse(loaded, key)
+    if clip is None:
+        clip = MODEL_CACHE.get(key)
+    if clip is None:
+        clip = comfy.sd.load_clip(
+            ckpt_paths=clip_paths,
+            embedding_directory=folder_paths.get_folder_paths("embeddings"),
+            clip_type=clip_type,
+            model_options=clip_model_options(device)
+        )
+        MODEL_CACHE.put(key, clip, sum(signature[2] for signature in signatures))
+    return (key, clip)
+
+
+def load_vae(vae_name, loaded=None):
+    """Load a VAE; returns a (key, vae) slot that callers pass back as loaded."""
+    # Built-in VAEs such as taesd or pixel_space have no single backing file
+    vae_path = folder_paths.get_full_path("vae", vae_name)
+    signature = file_signature(vae_path) if vae_path and os.path.isfile(vae_path) else (vae_name, 0, 0)
+    key = ("vae", signature)
+    vae = _reuse(loaded, key)
+    if vae is None:
+        vae = MODEL_CACHE.get(key)
+    if vae is None:
+        vae = nodes.VAELoader().load_vae(vae_name)[0]
+        MODEL_CACHE.put(key, vae, signature[2])
+    return (key, vae)
+
+
+def run_loaders(loaders, parallel=False, fail_fast=()):
+    """Run named loader callables in order or on a thread pool.
+
+    Returns {name: (result, error, seconds)}. In sequential mode, loading stops after
+    a failure in any loader named in fail_fast, matching the original raise-early flow.
+    """
+    def timed(loader):
+        start = time.perf_counter()
+        try:
+            return (loader(), None, time.perf_counter() - start)
+        except Exception as e:
+            return (None, e, time.perf_counter() - start)
+
+    results = {}
+    if parallel:
+        with ThreadPoolExecutor(max_workers=len(loaders), thread_name_prefix="prepack_load") as pool:
+            futures = {name: pool.submit(timed, loader) for name, loader in loaders.items()}
+            for name, future in futures.items():
+                results[name] = future.result()
+    else:
+        for name, loader in loaders.items():
+            results[name] = timed(loader)
+            if results[name][1] is not None and name in fail_fast:
+                break
+    return results
+
+
+def format_timings(results, total):
+    parts = [f"{name} {seconds:.2f}s" for name, (_, _, seconds) in results.items()]
+    return ", ".join(parts) + f" (wall {total:.2f}s)"
@@ -1,26 +1,33 @@
-import folder_paths
-import torch
+import time
 import comfy.sd
-import nodes
+from .modelCache import load_unet, load_clip, load_vae, run_loaders, format_timings
+from .loadPlanner import plan_load
+from .fileIndex import get_filename_list
 
 """Prepack_Model_SingleCLIP: load a diffusion UNet and a single CLIP in one step."""
 
 
 class PrepackModelSingleCLIP:
+    def __init__(self):
+        # Per-component (key, object) slots so changing one widget only reloads that component
+        self.loaded_unet = None
+        self.loaded_clip = None
+        self.loaded_vae = None
+
     @classmethod
     def INPUT_TYPES(s):
         return {
             "required": {
-                "unet_name": (folder_paths.get_filename_list("diffusion_models"), {
+                "unet_name": (get_filename_list("diffusion_models"), {
                     "tooltip": "The name of the diffusion model (UNET) to load."
                 }),
-                "weight_dtype": (["default", "fp8_e4m3fn", "fp8_e4m3fn_fast", "fp8_e5m2"], {
-                    "tooltip": "The weight dtype for the diffusion model."
+                "weight_dtype": (["default", "fp8_e4m3fn", "fp8_e4m3fn_fast", "fp8_e5m2", "auto"], {
+                    "tooltip": "The weight dtype for the diffusion model. 'auto' picks fp8 when the estimated model size does not fit in free memory."
                 }),
-                "vae_name": (folder_paths.get_filename_list("vae"), {
+                "vae_name": (get_filename_list("vae"), {
                     "tooltip": "The VAE to load."
                 }),
-                "clip_name": (folder_paths.get_filename_list("text_encoders"), {
+                "clip_name": (get_filename_list("text_encoders"), {
                     "tooltip": "The name of the CLIP model to load."
                 }),
                 "type": ([
@@ -32,7 +39,8 @@ class PrepackModelSingleCLIP:
                 }),
             },
             "optional": {
-                "device": (["default", "cpu"], {"advanced": True, "tooltip": "Device override for CLIP loading/offloading. Use 'cpu' to force CPU; 'default' lets Comfy manage devices."}),
+                "device": (["default", "cpu", "auto"], {"advanced": True, "tooltip": "Device override for CLIP loading/offloading. Use 'cpu' to force CPU; 'default' lets Comfy manage devices; 'auto' uses CPU when CLIP would not fit in free VRAM."}),
+                "load_mode": (["sequential", "parallel"], {"advanced": True, "tooltip": "Load UNet, CLIP and VAE one after another, or overlap their disk reads on a thread pool."}),
             }
         }
 
@@ -48,48 +56,40 @@ class PrepackModelSingleCLIP:
     CATEGORY = "💀Prepack"
     DESCRIPTION = "Load a diffusion UNet and a single CLIP in one step (types follow official Load CLIP node)."
 
-    def load_prepack(self, unet_name, weight_dtype, vae_name, clip_name,  type, device="default"):
-        model_options = {}
-        try:
-            if weight_dtype == "fp8_e4m3fn":
-                model_options["dtype"] = torch.float8_e4m3fn
-            elif weight_dtype == "fp8_e4m3fn_fast":
-                model_options["dtype"] = torch.float8_e4m3fn
-                model_options["fp8_optimizations"] = True
-            elif weight_dtype == "fp8_e5m2":
-                model_options["dtype"] = torch.float8_e5m2
-        except AttributeError:
-            pass
+    def load_prepack(self, unet_name, weight_dtype, vae_name, clip_name,  type, device="default", load_mode="sequential"):
+        clip_type = getattr(comfy.sd.CLIPType, type.upper(), comfy.sd.CLIPType.STABLE_DIFFUSION)
 
-        try:
-            unet_path = folder_paths.get_full_path_or_raise("diffusion_models", unet_name)
-            model = comfy.sd.load_diffusion_model(unet_path, model_options=model_options)
-        except Exception as e:
-            raise RuntimeError(f"Failed to load diffusion model '{unet_name}': {str(e)}")
+        if weight_dtype == "auto" or device == "auto":
+            try:
+                weight_dtype, device, summary = plan_load(unet_name, [clip_name], vae_name, weight_dtype, device, self.loaded_unet)
+                print(f"Info: Prepack Model SingleCLIP load plan: {summary}")
+            except Exception as e:
+                print(f"Warning: Failed to plan model load: {str(e)}. Using default weight_dtype and device.")
+                weight_dtype = "default" if weight_dtype == "auto" else weight_dtype
+                device = "default" if device == "auto" else device
 
-        try:
-            clip_model_options = {}
-            if device == "cpu":
-                clip_model_options["load_device"] = clip_model_options["offload_device"] = torch.device("cpu")
+        loaders = {
+            "unet": lambda: load_unet(unet_name, weight_dtype, self.loaded_unet),
+            "clip": lambda: load_clip([clip_name], clip_type, device, self.loaded_clip),
+            "vae": lambda: load_vae(vae_name, self.loaded_vae),
+        }
+        start = time.perf_counter()
+        results = run_loaders(loaders, parallel=(load_mode == "parallel"), fail_fast=("unet", "clip"))
+        print(f"Info: Prepack Model SingleCLIP {load_mode} load: {format_timings(results, time.perf_counter() - start)}")
 
-            clip_path = folder_paths.get_full_path_or_raise("text_encoders", clip_name)
-            clip_type = getattr(comfy.sd.CLIPType, type.upper(), comfy.sd.CLIPType.STABLE_DIFFUSION)
+        self.loaded_unet, error, _ = results["unet"]
+        if error is not None:
+            raise RuntimeError(f"Failed to load diffusion model '{unet_name}': {str(error)}")
 
-            clip = comfy.sd.load_clip(
-                ckpt_paths=[clip_path],
-                embedding_directory=folder_paths.get_folder_paths("embeddings"),
-                clip_type=clip_type,
-                model_options=clip_model_options
-            )
-        except Exception as e:
-            raise RuntimeError(f"Failed to load CLIP model '{clip_name}': {str(e)}")
+        self.loaded_clip, error, _ = results["clip"]
+        if error is not None:
+            raise RuntimeError(f"Failed to load CLIP model '{clip_name}': {str(error)}")
 
-        try:
-            vae = nodes.VAELoader().load_vae(vae_name)[0]
-        except Exception as e:
-            print(f"Warning: Failed to load VAE '{vae_name}': {str(e)}. Returning None.")
-            vae = None
+        self.loaded_vae, error, _ = results["vae"]
+        if error is not None:
+            print(f"Warning: Failed to load VAE '{vae_name}': {str(error)}. Returning None.")
 
+        model = self.loaded_unet[1]
+        clip = self.loaded_clip[1]
+        vae = self.loaded_vae[1] if self.loaded_vae is not None else None
         return (model, clip, vae)
-
-
@@ -0,0 +1,60 @@
+import torch
+import comfy.model_management
+
+"""Prepack VAE decode: full, tiled and out-of-memory-safe latent decoding shared by the Prepack samplers."""
+
+
+DECODE_MODES = ["auto", "full", "tiled"]
+
+
+def decode_tiled(vae, samples, tile_size=512, overlap=64):
+    """Decode in overlapping spatial tiles; tile_size and overlap are in pixels, seams are feather-blended by comfy."""
+    # Same parameter handling as ComfyUI's VAEDecodeTiled node
+    if tile_size < overlap * 4:
+        overlap = tile_size // 4
+    compression = vae.spacial_compression_decode() if hasattr(vae, "spacial_compression_decode") else 8
+    tile = max(tile_size // compression, 1)
+    return vae.decode_tiled(samples, tile_x=tile, tile_y=tile, overlap=overlap // compression)
+
+
+def _decode(vae, samples, mode, tile_size, overlap):
+    if mode == "tiled":
+        return decode_tiled(vae, samples, tile_size, overlap)
+    try:
+        # comfy's VAE.decode catches OOM itself and retries with its own default tiles, so this handler
+        # only runs for VAEs that let the error through
+        return vae.decode(samples)
+    except comfy.model_management.OOM_EXCEPTION:
+        if mode != "auto":
+            raise
+        print(f"Warning: Ran out of memory during full VAE decode; retrying with {tile_size}px tiles.")
+        comfy.model_management.soft_empty_cache()
+        return decode_tiled(vae, samples, tile_size, overlap)
+
+
+def decode_samples(vae, samples, mode="auto", tile_size=512, overlap=64, batch_size=0):
+    """Decode latents with the VAE.
+
+    mode "full" decodes the whole latent at once, "tiled" always decodes in tiles, and "auto" tries a
+    full decode first and retries in tiles when it runs out of memory. batch_size > 0 decodes that many
+    latents at a time into one preallocated output, so peak decode memory follows the chunk size.
+
+    "full" means Prepack does no tiling; it does not guarantee an untiled decode. comfy's VAE.decode
+    retries tiled on out-of-memory (logging a warning) before the error reaches this function, so "auto"
+    only applies tile_size/overlap to VAEs that raise instead. Tiled output matches a full decode within
+    a small tolerance, with differences concentrated at tile seams.
+    """
+    with torch.no_grad():
+        total = samples.shape[0]
+        if batch_size <= 0 or batch_size >= total:
+            return _decode(vae, samples, mode, tile_size, overlap)
+
+        images = None
+        for start in range(0, total, batch_size):
+            chunk = _decode(vae, samples[start:start + batch_size], mode, tile_size, overlap)
+            if images is None:
+                # Allocate the full output once from the first chunk's shape instead of concatenating
+                images = torch.empty((total,) + tuple(chunk.shape[1:]), dtype=chunk.dtype, device=chunk.device)
+            images[start:start + chunk.shape[0]] = chunk
+            del chunk
+        return images